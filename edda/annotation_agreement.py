@@ -0,0 +1,213 @@
+"""
+Agreement between two POS annotations of the same text.
+
+Token streams are first aligned on their normalized forms, because the annotations do not always split words the
+same way (compare voluspa_annotations_menota.txt and voluspa_annotations_besnier.txt). Agreement and confusion
+matrices are then computed with NumPy on the feature matrices of the aligned tokens.
+"""
+import difflib
+from collections import namedtuple
+
+import numpy as np
+
+from pos_utils import FEATURE_INDICES, FEATURE_NAMES
+
+__author__ = ["Clément Besnier <clemsciences@aol.com>", ]
+
+
+# Indices of the tokens aligned one to one, and the groups of tokens which only match once concatenated
+Alignment = namedtuple("Alignment", ["left", "right", "merges"])
+AgreementReport = namedtuple("AgreementReport", ["alignment", "agreement", "confusion"])
+
+NORMALIZATION = str.maketrans({"ǫ": "ö", "ø": "ö", "ǿ": "æ", "œ": "æ"})
+PUNCTUATION = "':?!.,;-()[]"
+
+
+def normalize_form(form: str) -> str:
+    """
+    >>> normalize_form("Vǫluspá,")
+    'völuspá'
+
+    :param form: word as written in an annotation
+    :return: lower-cased form without punctuation, with the same letters for orthographic variants
+    """
+    return (form or "").lower().translate(NORMALIZATION).strip(PUNCTUATION)
+
+
+def align_tokens(left_forms, right_forms) -> Alignment:
+    """
+    Aligns two token streams with difflib.SequenceMatcher on the normalized forms.
+    In the blocks which differ, tokens are concatenated until both sides spell the same string, which handles
+    words that one annotation splits and the other does not.
+
+    >>> alignment = align_tokens(["viltu", "at", "ek"], ["vildu", "at", "ek"])
+    >>> alignment.left.tolist(), alignment.right.tolist()
+    ([0, 1, 2], [0, 1, 2])
+    >>> alignment = align_tokens(["Heimdalar", "vildu", "at", "ek"], ["Heimdalar", "vilduat", "ek"])
+    >>> alignment.left.tolist(), alignment.right.tolist(), alignment.merges
+    ([0, 3], [0, 2], [([1, 2], [1])])
+
+    :param left_forms: forms of the first annotation
+    :param right_forms: forms of the second annotation
+    :return: Alignment
+    """
+    left = [normalize_form(form) for form in left_forms]
+    right = [normalize_form(form) for form in right_forms]
+    left_indices = []
+    right_indices = []
+    merges = []
+    matcher = difflib.SequenceMatcher(None, left, right, autojunk=False)
+    for operation, i1, i2, j1, j2 in matcher.get_opcodes():
+        if operation == "equal":
+            left_indices.extend(range(i1, i2))
+            right_indices.extend(range(j1, j2))
+        elif operation == "replace":
+            align_block(left, right, i1, i2, j1, j2, left_indices, right_indices, merges)
+    return Alignment(np.asarray(left_indices, dtype=np.intp), np.asarray(right_indices, dtype=np.intp), merges)
+
+
+def align_block(left, right, i1, i2, j1, j2, left_indices, right_indices, merges):
+    """
+    Aligns left[i1:i2] with right[j1:j2], where no form is shared.
+    Groups which do not spell the same string are paired one to one when both have one token (spelling variants),
+    and dropped otherwise.
+    """
+    i, j = i1, j1
+    while i < i2 and j < j2:
+        left_group = [i]
+        right_group = [j]
+        left_string = left[i]
+        right_string = right[j]
+        while left_string != right_string:
+            if len(left_string) < len(right_string) and left_group[-1] + 1 < i2 and \
+                    right_string.startswith(left_string):
+                left_group.append(left_group[-1] + 1)
+                left_string += left[left_group[-1]]
+            elif len(right_string) < len(left_string) and right_group[-1] + 1 < j2 and \
+                    left_string.startswith(right_string):
+                right_group.append(right_group[-1] + 1)
+                right_string += right[right_group[-1]]
+            else:
+                break
+        if len(left_group) == 1 and len(right_group) == 1:
+            left_indices.append(i)
+            right_indices.append(j)
+        elif left_string == right_string:
+            merges.append((left_group, right_group))
+        i = left_group[-1] + 1
+        j = right_group[-1] + 1
+
+
+def feature_agreement(left_features, right_features) -> np.ndarray:
+    """
+    >>> feature_agreement(np.array([[True, False], [True, True]]), np.array([[True, True], [False, True]])).tolist()
+    [0.5, 0.5]
+    >>> feature_agreement([], []).shape == (len(FEATURE_NAMES),)
+    True
+
+    :param left_features: boolean matrix of the aligned tokens of the first annotation
+    :param right_features: boolean matrix of the same shape for the second annotation
+    :return: rate of agreement of each feature (column)
+    """
+    left_features = np.asarray(left_features, dtype=bool)
+    right_features = np.asarray(right_features, dtype=bool)
+    if len(left_features) == 0:
+        return np.ones(left_features.shape[1] if left_features.ndim == 2 else len(FEATURE_NAMES))
+    return (left_features == right_features).mean(axis=0)
+
+
+def feature_confusion(left_features, right_features) -> np.ndarray:
+    """
+    >>> feature_confusion(np.array([[True], [True], [False]]), np.array([[True], [False], [False]])).tolist()
+    [[[1, 0], [1, 1]]]
+
+    :param left_features: boolean matrix of the aligned tokens of the first annotation
+    :param right_features: boolean matrix of the same shape for the second annotation
+    :return: array of shape (number of features, 2, 2), [f, a, b] counts the tokens whose feature f is a on the left
+    and b on the right
+    """
+    left_features = np.asarray(left_features, dtype=bool)
+    right_features = np.asarray(right_features, dtype=bool)
+    counts = [(~left_features & ~right_features).sum(axis=0), (~left_features & right_features).sum(axis=0),
+              (left_features & ~right_features).sum(axis=0), (left_features & right_features).sum(axis=0)]
+    return np.stack(counts, axis=1).reshape(-1, 2, 2)
+
+
+def label_codes(values, labels, sorter) -> np.ndarray:
+    """
+    :param values: labels of the tokens
+    :param labels: labels of the rows and columns
+    :param sorter: indices which sort labels
+    :return: position of each value in labels
+    """
+    if len(labels) == 0:
+        positions = np.zeros(len(values), dtype=np.intp)
+        unknown = np.ones(len(values), dtype=bool)
+    else:
+        positions = sorter[np.searchsorted(labels, values, sorter=sorter).clip(0, len(labels) - 1)]
+        unknown = labels[positions] != values
+    if unknown.any():
+        raise ValueError("unknown labels: {}".format(", ".join(sorted(set(values[unknown].tolist())))))
+    return positions
+
+
+def confusion_matrix(left_labels, right_labels, labels=None):
+    """
+    >>> labels, matrix = confusion_matrix(["NOUN", "VERB", "NOUN"], ["NOUN", "NOUN", "NOUN"])
+    >>> labels.tolist(), matrix.tolist()
+    (['NOUN', 'VERB'], [[2, 0], [1, 0]])
+    >>> confusion_matrix(["VERB", "NOUN"], ["NOUN", "NOUN"], ["VERB", "NOUN"])[1].tolist()
+    [[0, 1], [0, 1]]
+    >>> confusion_matrix(["ADV", "NOUN"], ["NOUN", "NOUN"], ["NOUN", "VERB"])
+    Traceback (most recent call last):
+    ...
+    ValueError: unknown labels: ADV
+
+    :param left_labels: labels of the aligned tokens of the first annotation, like universal tags
+    :param right_labels: labels of the same tokens in the second annotation
+    :param labels: labels of the rows and columns, by default all the labels found, sorted
+    :return: labels and matrix whose [a, b] element counts the tokens labelled a on the left and b on the right
+    """
+    left_labels = np.asarray(left_labels, dtype=str)
+    right_labels = np.asarray(right_labels, dtype=str)
+    if labels is None:
+        labels = np.unique(np.concatenate([left_labels, right_labels]))
+    labels = np.asarray(labels, dtype=str)
+    sorter = np.argsort(labels, kind="stable")
+    left_codes = label_codes(left_labels, labels, sorter)
+    right_codes = label_codes(right_labels, labels, sorter)
+    n_labels = len(labels)
+    matrix = np.bincount(left_codes * n_labels + right_codes, minlength=n_labels * n_labels)
+    return labels, matrix.reshape(n_labels, n_labels)
+
+
+def compare_annotations(left_forms, left_features, right_forms, right_features) -> AgreementReport:
+    """
+    >>> from annotation_files import iter_annotated_lines
+    >>> from pos_icepahc import parse_many_icepahc
+    >>> from pos_menota import parse_many
+    >>> besnier = [token for line in iter_annotated_lines("voluspa_annotations_besnier.txt") for token in line.tokens]
+    >>> menota = [token for line in iter_annotated_lines("voluspa_annotations_menota.txt") for token in line.tokens]
+    >>> besnier_features = parse_many_icepahc([token.tag for token in besnier])
+    >>> menota_features = parse_many([token.tag for token in menota])
+    >>> report = compare_annotations([token.form for token in besnier], besnier_features,
+    ...                              [token.form for token in menota], menota_features)
+    >>> len(report.alignment.left)
+    1273
+    >>> report.confusion[FEATURE_INDICES["noun"]].tolist(), report.confusion[FEATURE_INDICES["plural"]].tolist()
+    ([[784, 38], [25, 426]], [[957, 44], [26, 246]])
+
+    :param left_forms: forms of the first annotation
+    :param left_features: feature matrix of the first annotation, one row per form
+    :param right_forms: forms of the second annotation
+    :param right_features: feature matrix of the second annotation
+    :return: alignment, per-feature agreement and per-feature confusion matrices
+    """
+    alignment = align_tokens(left_forms, right_forms)
+    left = np.asarray(left_features, dtype=bool)[alignment.left]
+    right = np.asarray(right_features, dtype=bool)[alignment.right]
+    return AgreementReport(alignment, feature_agreement(left, right), feature_confusion(left, right))
+
+
+def format_agreement(agreement) -> str:
+    return "\n".join("{:<30} {:.3f}".format(name, rate) for name, rate in zip(FEATURE_NAMES, agreement))
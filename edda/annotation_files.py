@@ -0,0 +1,269 @@
+"""
+Reader and writer of the annotation files like voluspa_annotations_menota.txt and voluspa_annotations_besnier.txt.
+
+Each line of a poem is a block: the words of the line, then one annotated token by row,
+
+    form [lemma] -> verbose : raw-tag
+
+Blocks are separated by two empty rows. A block whose text is a number starts a new stanza.
+A sidecar index (filename + ".idx") stores the byte offset of each block, so that a stanza or a line can be read
+without scanning the file.
+"""
+import json
+import os
+from collections import namedtuple
+
+__author__ = ["Clément Besnier <clemsciences@aol.com>", ]
+
+
+AnnotatedToken = namedtuple("AnnotatedToken", ["form", "lemma", "verbose", "tag"])
+AnnotatedLine = namedtuple("AnnotatedLine", ["stanza", "text", "tokens"])
+
+INDEX_EXTENSION = ".idx"
+
+
+def parse_token(row: str) -> AnnotatedToken:
+    """
+    >>> parse_token("Hljóðs [HLJÓÐ] -> noun neuter singular genitive : NHEE")
+    AnnotatedToken(form='Hljóðs', lemma='HLJÓÐ', verbose='noun neuter singular genitive', tag='NHEE')
+    >>> parse_token("1 [UNK] ->  : TA")
+    AnnotatedToken(form='1', lemma='UNK', verbose='', tag='TA')
+
+    :param row: annotated token
+    :return: its fields
+    """
+    head, _, tag = row.rpartition(" : ")
+    head, _, verbose = head.partition(" -> ")
+    form, _, lemma = head.partition(" [")
+    return AnnotatedToken(form, lemma[:-1] if lemma.endswith("]") else lemma, verbose, tag)
+
+
+def format_token(token: AnnotatedToken) -> str:
+    return token.form + " [" + token.lemma + "]" + " -> " + token.verbose + " : " + token.tag
+
+
+def format_line(line: AnnotatedLine) -> str:
+    """
+    :param line: annotated line
+    :return: the block, with the two empty rows which follow it
+    """
+    return "\n".join([line.text] + [format_token(token) for token in line.tokens] + ["\n"])
+
+
+def stanza_number(text: str):
+    """
+    :param text: text of a block
+    :return: the number of the stanza it starts, None if it is not a stanza number
+    """
+    text = text.strip()
+    return int(text) if text.isdigit() else None
+
+
+def iter_blocks(f, offset=0):
+    """
+    :param f: annotation file opened in binary mode
+    :param offset: byte offset where reading starts
+    :return: generator of (byte offset, rows) for each block
+    """
+    f.seek(offset)
+    rows = []
+    start = offset
+    position = offset
+    for raw_row in f:
+        row = raw_row.decode("utf-8").rstrip("\r\n")
+        if row:
+            if not rows:
+                start = position
+            rows.append(row)
+        elif rows:
+            yield start, rows
+            rows = []
+        position += len(raw_row)
+    if rows:
+        yield start, rows
+
+
+def iter_annotated_lines(filename: str):
+    """
+    Streams the lines of an annotation file.
+
+    :param filename: path to an annotation file
+    :return: generator of AnnotatedLine
+    """
+    stanza = None
+    with open(filename, "rb") as f:
+        for _, rows in iter_blocks(f):
+            number = stanza_number(rows[0])
+            if number is not None:
+                stanza = number
+            yield AnnotatedLine(stanza, rows[0], [parse_token(row) for row in rows[1:]])
+
+
+def write_annotations(filename: str, lines):
+    """
+    Writes lines in the format read by iter_annotated_lines, and removes the now stale index.
+
+    :param filename: path to the annotation file
+    :param lines: iterable of AnnotatedLine
+    """
+    with open(filename, "w", encoding="utf-8", newline="\n") as f:
+        first = True
+        for line in lines:
+            if not first:
+                f.write("\n")
+            f.write(format_line(line))
+            first = False
+    if os.path.exists(filename + INDEX_EXTENSION):
+        os.remove(filename + INDEX_EXTENSION)
+
+
+class AnnotationFile:
+    """
+    Random access to the lines and stanzas of an annotation file through its sidecar index.
+    The index is rebuilt when the size or the modification time of the file changed.
+
+    >>> annotations = AnnotationFile("voluspa_annotations_besnier.txt", index_filename=None)
+    >>> annotations.line(1).text
+    'Hljóðs bið ek allar'
+    >>> [line.text for line in annotations.stanza(2)][:2]
+    ['2', 'Ek man jötna']
+
+    """
+    def __init__(self, filename: str, index_filename=INDEX_EXTENSION):
+        """
+        :param filename: path to the annotation file
+        :param index_filename: path to the index, filename + ".idx" by default, None to keep the index in memory
+        """
+        self.filename = filename
+        if index_filename == INDEX_EXTENSION:
+            index_filename = filename + INDEX_EXTENSION
+        self.index_filename = index_filename
+        self.offsets = []
+        self.stanzas = []
+        self.load_index()
+
+    def signature(self) -> list:
+        status = os.stat(self.filename)
+        return [status.st_size, status.st_mtime_ns]
+
+    def load_index(self):
+        if self.index_filename is not None and os.path.exists(self.index_filename):
+            with open(self.index_filename, encoding="utf-8") as f:
+                index = json.load(f)
+            if index["signature"] == self.signature():
+                self.offsets = index["offsets"]
+                self.stanzas = index["stanzas"]
+                return
+        self.build_index()
+
+    def build_index(self):
+        offsets = []
+        stanzas = []
+        stanza = None
+        with open(self.filename, "rb") as f:
+            for offset, rows in iter_blocks(f):
+                number = stanza_number(rows[0])
+                if number is not None:
+                    stanza = number
+                offsets.append(offset)
+                stanzas.append(stanza)
+        self.offsets = offsets
+        self.stanzas = stanzas
+        if self.index_filename is not None:
+            with open(self.index_filename, "w", encoding="utf-8") as f:
+                json.dump({"signature": self.signature(), "offsets": offsets, "stanzas": stanzas}, f)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        return iter_annotated_lines(self.filename)
+
+    def read_lines(self, start: int, stop: int) -> list:
+        """
+        :param start: index of the first line
+        :param stop: index after the last line
+        :return: AnnotatedLine list
+        """
+        lines = []
+        if start >= stop:
+            return lines
+        with open(self.filename, "rb") as f:
+            for i, (_, rows) in zip(range(start, stop), iter_blocks(f, self.offsets[start])):
+                lines.append(AnnotatedLine(self.stanzas[i], rows[0], [parse_token(row) for row in rows[1:]]))
+        return lines
+
+    def line(self, m: int) -> AnnotatedLine:
+        """
+        :param m: index of the line from 0, stanza numbers included
+        :return: the line
+        """
+        if m < 0:
+            m += len(self)
+        if not 0 <= m < len(self):
+            raise IndexError(m)
+        return self.read_lines(m, m + 1)[0]
+
+    def stanza_bounds(self, n: int):
+        """
+        :param n: stanza number
+        :return: indices of the first line of the stanza and of the line after it
+        :raises ValueError: if the file has no stanza numbers, such as the Menota annotations
+        :raises KeyError: if the file has no stanza n
+
+        >>> AnnotationFile("voluspa_annotations_menota.txt", index_filename=None).stanza_bounds(2)
+        Traceback (most recent call last):
+        ...
+        ValueError: voluspa_annotations_menota.txt has no stanza numbers, access its lines with line or read_lines
+        >>> AnnotationFile("voluspa_annotations_besnier.txt", index_filename=None).stanza_bounds(100)
+        Traceback (most recent call last):
+        ...
+        KeyError: 100
+
+        """
+        if all(stanza is None for stanza in self.stanzas):
+            raise ValueError(f"{os.path.basename(self.filename)} has no stanza numbers, "
+                             f"access its lines with line or read_lines")
+        try:
+            start = self.stanzas.index(n)
+        except ValueError:
+            raise KeyError(n)
+        stop = start
+        while stop < len(self.stanzas) and self.stanzas[stop] == n:
+            stop += 1
+        return start, stop
+
+    def stanza(self, n: int) -> list:
+        """
+        :param n: stanza number
+        :return: the lines of the stanza, the one with its number first
+        """
+        return self.read_lines(*self.stanza_bounds(n))
+
+    def replace_lines(self, start: int, stop: int, lines):
+        """
+        Replaces lines start to stop (excluded) by lines, copying the rest of the file without parsing it.
+
+        :param start: index of the first replaced line
+        :param stop: index after the last replaced line
+        :param lines: new AnnotatedLine
+        """
+        with open(self.filename, "rb") as f:
+            content = f.read()
+        begin = self.offsets[start] if start < len(self) else len(content)
+        end = self.offsets[stop] if stop < len(self) else len(content)
+        new_content = "".join(format_line(line) + "\n" for line in lines).encode("utf-8")
+        if stop >= len(self):
+            new_content = new_content[:-1]
+        with open(self.filename, "wb") as f:
+            f.write(content[:begin])
+            f.write(new_content)
+            f.write(content[end:])
+        self.build_index()
+
+    def replace_stanza(self, n: int, lines):
+        """
+        :param n: stanza number
+        :param lines: new lines of the stanza
+        """
+        self.replace_lines(*self.stanza_bounds(n), lines)
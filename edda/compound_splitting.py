@@ -0,0 +1,244 @@
+"""
+Classification of the lemmata which are not headwords of Zoëga's dictionary, like the buckets of
+voeluspaa_lexicon.ipynb: merges (þær+es), spelling variants (eftir for eptir), compounds (vígband) and not found.
+
+Compounds are split by dynamic programming over the split points: every element but the last one is a headword or
+the stem of a headword, possibly followed by the genitive s, and the last element is a headword. The best split of
+each suffix is memoized, so that compounds which end with the same elements are only split once in a batch.
+
+$ python compound_splitting.py Völuspá
+"""
+import argparse
+import sys
+from collections import namedtuple
+
+from zoega_index import FuzzyIndex, PrefixIndex, get_fuzzy_index, get_headword_index, normalize_headword
+
+__author__ = ["Clément Besnier <clemsciences@aol.com>", ]
+
+
+FOUND = "found"
+MERGES = "merges"
+SPELLING_VARIANTS = "spelling_variants"
+COMPOUNDS = "compounds"
+NOT_FOUND = "not_found"
+CATEGORIES = [FOUND, MERGES, SPELLING_VARIANTS, COMPOUNDS, NOT_FOUND]
+
+MERGE_DELIMITER = "+"
+# Endings removed from the headwords to get the stems used as first elements: jötunn -> jötun, dagr -> dag
+STEM_ENDINGS = ["ja", "ur", "r", "a", "i", "n"]
+LINKING_LETTERS = ["s"]
+
+# Costs of the elements of a split: fewer elements are better, stems and linking letters are penalized
+ELEMENT_COST = 1.
+STEM_COST = .25
+LINKING_COST = .25
+# A split competes with a spelling variant: its cost beyond a single headword, plus SHORT_ELEMENT_COST for each
+# element as short as the function words (ei, at, of), is compared with EDIT_COST for each edit of the variant
+SHORT_ELEMENT_LENGTH = 2
+SHORT_ELEMENT_COST = 1.
+EDIT_COST = 2.
+
+Decomposition = namedtuple("Decomposition", ["elements", "cost"])
+LemmaClassification = namedtuple("LemmaClassification", ["lemma", "category", "decomposition", "matches"])
+
+
+def headword_stems(headwords) -> set:
+    """
+    >>> sorted(headword_stems(["dagr", "jötunn", "band"]))
+    ['dag', 'jötun']
+
+    :param headwords: normalized headwords
+    :return: the headwords without their ending, when the stem is long enough to be an element
+    """
+    stems = set()
+    for headword in headwords:
+        for ending in STEM_ENDINGS:
+            if headword.endswith(ending) and len(headword) - len(ending) >= 2:
+                stems.add(headword[:-len(ending)])
+    return stems
+
+
+class CompoundSplitter:
+    """
+    >>> splitter = CompoundSplitter(["víg", "band", "jötunn", "heimr", "dagr", "verk", "skálm", "öld"])
+    >>> splitter.split("vígband")
+    Decomposition(elements=('víg', 'band'), cost=2.0)
+    >>> splitter.split("jötunheimr").elements
+    ('jötun', 'heimr')
+    >>> splitter.split("dagsverk").elements
+    ('dag', 's', 'verk')
+    >>> splitter.split("skalmöld") is None
+    True
+
+    """
+    def __init__(self, headwords, min_length=2):
+        """
+        :param headwords: normalized headwords, like HeadwordIndex.keys() or a PrefixIndex
+        :param min_length: shortest element
+        """
+        if isinstance(headwords, PrefixIndex):
+            self.headwords = headwords
+        else:
+            self.headwords = PrefixIndex(headwords)
+        self.stems = PrefixIndex(headword_stems(self.headwords.words) - set(self.headwords.words))
+        self.min_length = min_length
+        self.memo = {}
+
+    def first_elements(self, word: str):
+        """
+        :param word: normalized word
+        :return: generator of the (element, cost) which may begin the word
+        """
+        for prefix in self.headwords.prefixes_of(word, self.min_length):
+            yield prefix, ELEMENT_COST
+        for prefix in self.stems.prefixes_of(word, self.min_length):
+            yield prefix, ELEMENT_COST + STEM_COST
+
+    def split(self, word: str):
+        """
+        :param word: normalized word
+        :return: the cheapest Decomposition of the word into headwords, None if there is none
+        """
+        if word in self.memo:
+            return self.memo[word]
+        best = None
+        if len(word) >= self.min_length and word in self.headwords:
+            best = Decomposition((word,), ELEMENT_COST)
+        for element, cost in self.first_elements(word):
+            rest = word[len(element):]
+            splits = [((element,), cost, rest)]
+            for letter in LINKING_LETTERS:
+                if rest.startswith(letter):
+                    splits.append(((element, letter), cost + LINKING_COST, rest[len(letter):]))
+            for elements, elements_cost, rest in splits:
+                if len(rest) < self.min_length:
+                    continue
+                rest_decomposition = self.split(rest)
+                if rest_decomposition is not None and \
+                        (best is None or elements_cost + rest_decomposition.cost < best.cost):
+                    best = Decomposition(elements + rest_decomposition.elements,
+                                         elements_cost + rest_decomposition.cost)
+        self.memo[word] = best
+        return best
+
+
+def split_penalty(decomposition: Decomposition) -> float:
+    """
+    >>> split_penalty(Decomposition(("dag", "s", "verk"), 2.5)), split_penalty(Decomposition(("ei", "land"), 2.))
+    (1.5, 2.0)
+
+    :param decomposition: split of a word into several elements
+    :return: cost of the split beyond a single headword, with a penalty for each element as short as a function word
+    """
+    n_short = sum(1 for element in decomposition.elements
+                  if len(element) <= SHORT_ELEMENT_LENGTH and element not in LINKING_LETTERS)
+    return decomposition.cost - ELEMENT_COST + SHORT_ELEMENT_COST * n_short
+
+
+def classify_lemma(lemma: str, index, splitter: CompoundSplitter, fuzzy_index=None) -> LemmaClassification:
+    """
+    >>> from zoega_index import HeadwordIndex, Headword, FuzzyIndex
+    >>> index = HeadwordIndex([Headword(word) for word in ["víg", "band", "eptir", "sá", "er", "heimr"]])
+    >>> splitter = CompoundSplitter(index.prefix_index)
+    >>> fuzzy_index = FuzzyIndex(index.keys())
+    >>> [classify_lemma(lemma, index, splitter, fuzzy_index).category
+    ...  for lemma in ["heimr", "sá+er", "eftir", "vígband", "glýja"]]
+    ['found', 'merges', 'spelling_variants', 'compounds', 'not_found']
+
+    A split is compared with the closest spelling variant. With headwords of Zoëga's dictionary, dagsverk is rather
+    dag+s+verk than a variant of dagverk, but eiland is a variant of eyland rather than ei+land:
+
+    >>> headwords = ["dagr", "verk", "dagverk", "ei", "ey", "land", "eyland", "ár", "at", "af", "ef", "eptir"]
+    >>> index = HeadwordIndex([Headword(word) for word in headwords])
+    >>> splitter = CompoundSplitter(index.prefix_index)
+    >>> fuzzy_index = FuzzyIndex(index.keys())
+    >>> classifications = [classify_lemma(lemma, index, splitter, fuzzy_index)
+    ...                    for lemma in ["dagsverk", "árdagr", "eiland", "eftir"]]
+    >>> [classification.category for classification in classifications]
+    ['compounds', 'compounds', 'spelling_variants', 'spelling_variants']
+    >>> classifications[0].decomposition.elements, classifications[1].decomposition.elements
+    (('dag', 's', 'verk'), ('ár', 'dagr'))
+    >>> classifications[2].matches[0]
+    FuzzyMatch(word='eyland', distance=1)
+
+    :param lemma: lemma
+    :param index: HeadwordIndex
+    :param splitter: CompoundSplitter over the headwords of index
+    :param fuzzy_index: FuzzyIndex over the headwords of index, None to skip the search of spelling variants
+    :return: category of the lemma, with the decomposition or the approximate matches which justify it
+    """
+    word = normalize_headword(lemma)
+    if MERGE_DELIMITER in word:
+        parts = tuple(part for part in word.split(MERGE_DELIMITER) if part)
+        return LemmaClassification(lemma, MERGES, Decomposition(parts, ELEMENT_COST * len(parts)), [])
+    if word in index:
+        return LemmaClassification(lemma, FOUND, Decomposition((word,), ELEMENT_COST), [])
+
+    decomposition = splitter.split(word)
+    matches = fuzzy_index.query(word, k=5) if fuzzy_index is not None else []
+    if decomposition is not None and len(decomposition.elements) > 1 and \
+            (not matches or split_penalty(decomposition) < EDIT_COST * matches[0].distance):
+        return LemmaClassification(lemma, COMPOUNDS, decomposition, matches)
+    if matches:
+        return LemmaClassification(lemma, SPELLING_VARIANTS, None, matches)
+    return LemmaClassification(lemma, NOT_FOUND, None, [])
+
+
+def classify_lemmata(lemmata, index=None, splitter=None, fuzzy_index=None) -> dict:
+    """
+    >>> from zoega_index import HeadwordIndex, Headword
+    >>> categories = classify_lemmata(["eftir"], HeadwordIndex([Headword("eptir")]))
+    >>> [classification.lemma for classification in categories["spelling_variants"]]
+    ['eftir']
+
+    :param lemmata: lemmata, usually the misses of lexicon_linking.link_lemmata
+    :param index: HeadwordIndex, by default the one over all the entries of Zoëga's dictionary
+    :param splitter: CompoundSplitter, by default over the headwords of index
+    :param fuzzy_index: FuzzyIndex, by default the persisted one over the headwords of Zoëga's dictionary when index
+    is not given, and one over the headwords of index otherwise
+    :return: LemmaClassification list by category
+    """
+    if fuzzy_index is None:
+        fuzzy_index = get_fuzzy_index() if index is None else FuzzyIndex(index.keys())
+    if index is None:
+        index = get_headword_index()
+    if splitter is None:
+        splitter = CompoundSplitter(index.prefix_index)
+    categories = {category: [] for category in CATEGORIES}
+    for lemma in dict.fromkeys(lemmata):
+        classification = classify_lemma(lemma, index, splitter, fuzzy_index)
+        categories[classification.category].append(classification)
+    return categories
+
+
+def classify_poems(titles=None) -> dict:
+    """
+    Classifies in one batch the lemmata of the poems which are not headwords of Zoëga's dictionary.
+
+    :param titles: titles of the poems, all the poems of the Poetic Edda by default
+    :return: LemmaClassification list by category
+    """
+    from lexicon_linking import link_poems
+
+    misses = [lemma for report in link_poems(titles).values() for lemma in report.misses]
+    return classify_lemmata(misses)
+
+
+def report_categories(categories: dict, stream=sys.stdout):
+    total = sum(len(classifications) for classifications in categories.values())
+    for category in CATEGORIES:
+        classifications = categories.get(category, [])
+        stream.write("{:<20} {:>6} {:>8.3f}\n".format(category, len(classifications),
+                                                      len(classifications) / total if total else 0.))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classifies the lemmata which are not in Zoëga's dictionary.")
+    parser.add_argument("titles", nargs="*", help="titles of the poems, all the poems by default")
+    args = parser.parse_args(argv)
+    report_categories(classify_poems(args.titles or None))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Incremental writing of the annotation files of annotated_eddas.ipynb, like voluspa_annotations_besnier.txt.
+
+The hash of the forms, lemmata and tags of each stanza is kept in a manifest next to the annotation file
+(filename + ".manifest.json"). When a poem is annotated again, only the stanzas whose hash changed are decoded, the
+others are copied from the existing file.
+
+$ python incremental_annotation.py --output . Völuspá
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import unicodedata
+
+from annotation_files import AnnotatedLine, AnnotatedToken, AnnotationFile, format_line
+from pos_icepahc import parse_icepahc
+
+__author__ = ["Clément Besnier <clemsciences@aol.com>", ]
+
+
+# To increase when the decoding of the tags changes, so that all the stanzas are decoded again
+ANNOTATION_VERSION = "1"
+MANIFEST_EXTENSION = ".manifest.json"
+UNKNOWN = "UNK"
+ANNOTATION_SUFFIX = "_annotations_besnier.txt"
+# Letters of the titles which NFKD does not decompose into ASCII letters
+TRANSLITERATIONS = {"Þ": "Th", "þ": "th", "Ð": "D", "ð": "d", "Æ": "Ae", "æ": "ae", "Œ": "Oe", "œ": "oe",
+                    "Ø": "O", "ø": "o"}
+
+
+def annotate_stanza(stanza) -> list:
+    """
+    Annotates a stanza as annotated_eddas.ipynb does.
+
+    >>> lines = annotate_stanza([(["1"], [""], ["TA"]), (["Hljóðs"], ["HLJÓÐ"], ["NHEE"])])
+    >>> print(format_line(lines[1]).strip())
+    Hljóðs
+    Hljóðs [HLJÓÐ] -> noun neuter singular genitive : NHEE
+
+    :param stanza: list of lines, each line being the (forms, lemmata, tags) of its words
+    :return: AnnotatedLine list
+    """
+    lines = []
+    for forms, lemmata, tags in stanza:
+        tokens = []
+        for form, lemma, tag in zip(forms, lemmata, tags):
+            if not tag:
+                tokens.append(AnnotatedToken(form, lemma or UNKNOWN, UNKNOWN, UNKNOWN))
+            else:
+                tokens.append(AnnotatedToken(form, lemma or UNKNOWN, parse_icepahc(tag), tag))
+        lines.append(AnnotatedLine(None, " ".join(forms), tokens))
+    return lines
+
+
+def stanza_hash(stanza) -> str:
+    """
+    >>> stanza_hash([(["Hljóðs"], ["HLJÓÐ"], ["NHEE"])]) == stanza_hash([(["Hljóðs"], ["HLJÓÐ"], ["NHEE"])])
+    True
+    >>> stanza_hash([(["Hljóðs"], ["HLJÓÐ"], ["NHEE"])]) == stanza_hash([(["Hljóðs"], ["HLJÓÐ"], ["NHEO"])])
+    False
+
+    :param stanza: list of lines, each line being the (forms, lemmata, tags) of its words
+    :return: hexadecimal digest of the annotation version and of the stanza
+    """
+    content = json.dumps([ANNOTATION_VERSION, [[list(forms), list(lemmata), list(tags)]
+                                               for forms, lemmata, tags in stanza]], ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def manifest_filename(filename: str) -> str:
+    return filename + MANIFEST_EXTENSION
+
+
+def file_signature(filename: str) -> list:
+    status = os.stat(filename)
+    return [status.st_size, status.st_mtime_ns]
+
+
+def load_manifest(filename: str):
+    """
+    :param filename: path to the annotation file
+    :return: list of the [hash, number of lines] of its stanzas, None if the manifest is missing or out of date
+    """
+    if not os.path.exists(filename) or not os.path.exists(manifest_filename(filename)):
+        return None
+    with open(manifest_filename(filename), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != ANNOTATION_VERSION or manifest.get("signature") != file_signature(filename):
+        return None
+    return manifest["stanzas"]
+
+
+def save_manifest(filename: str, stanzas: list):
+    with open(manifest_filename(filename), "w", encoding="utf-8") as f:
+        json.dump({"version": ANNOTATION_VERSION, "signature": file_signature(filename), "stanzas": stanzas}, f)
+
+
+def annotate_incrementally(filename: str, stanzas) -> int:
+    """
+    Writes the annotations of the stanzas to filename, decoding only the stanzas which are not already there.
+
+    :param filename: path to the annotation file
+    :param stanzas: list of stanzas, each stanza being a list of the (forms, lemmata, tags) of its lines
+    :return: number of decoded stanzas
+    """
+    stanzas = list(stanzas)
+    hashes = [stanza_hash(stanza) for stanza in stanzas]
+    old_stanzas = load_manifest(filename)
+
+    # byte range of each stanza already written, indexed by its hash
+    existing = {}
+    content = b""
+    if old_stanzas is not None:
+        annotation_file = AnnotationFile(filename, index_filename=None)
+        with open(filename, "rb") as f:
+            content = f.read() + b"\n"
+        start = 0
+        for digest, n_lines in old_stanzas:
+            stop = start + n_lines
+            begin = annotation_file.offsets[start] if start < len(annotation_file) else len(content)
+            end = annotation_file.offsets[stop] if stop < len(annotation_file) else len(content)
+            existing[digest] = (begin, end, n_lines)
+            start = stop
+
+    segments = []
+    new_stanzas = []
+    n_decoded = 0
+    for digest, stanza in zip(hashes, stanzas):
+        if digest in existing:
+            begin, end, n_lines = existing[digest]
+            segments.append(content[begin:end])
+        else:
+            lines = annotate_stanza(stanza)
+            n_lines = len(lines)
+            segments.append("".join(format_line(line) + "\n" for line in lines).encode("utf-8"))
+            n_decoded += 1
+        new_stanzas.append([digest, n_lines])
+
+    if n_decoded == 0 and old_stanzas == new_stanzas:
+        return 0
+    with open(filename, "wb") as f:
+        f.write(b"".join(segments)[:-1])
+    save_manifest(filename, new_stanzas)
+    return n_decoded
+
+
+def poem_identifier(title: str) -> str:
+    """
+    >>> poem_identifier("Völuspá")
+    'voluspa'
+    >>> poem_identifier("Helgakviða Hundingsbana in fyrri"), poem_identifier("Þrymskviða")
+    ('helgakvida_hundingsbana_in_fyrri', 'thrymskvida')
+
+    :param title: title of a poem of eddas.reader.poetic_edda_titles
+    :return: lower-cased ASCII name, usable in file names
+    """
+    return re.sub(r"[^a-z0-9]+", "_", ascii_transliteration(title).lower()).strip("_")
+
+
+def ascii_transliteration(title: str) -> str:
+    """
+    Letters without ASCII decomposition are transliterated, so that two titles do not get the same file name.
+
+    >>> ascii_transliteration("Þrymskviða Ægis")
+    'Thrymskvida Aegis'
+    """
+    for letter, transliteration in TRANSLITERATIONS.items():
+        title = title.replace(letter, transliteration)
+    return unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode("ascii")
+
+
+def legacy_poem_identifier(title: str) -> str:
+    """
+    Identifier of the first annotation files, whose letters without ASCII decomposition were dropped.
+
+    >>> legacy_poem_identifier("Helgakviða Hundingsbana in fyrri")
+    'helgakvia_hundingsbana_in_fyrri'
+    """
+    ascii_title = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "_", ascii_title.lower()).strip("_")
+
+
+def annotation_filename(title: str, directory: str) -> str:
+    """
+    >>> annotation_filename("Völuspá", ".")
+    './voluspa_annotations_besnier.txt'
+
+    :param title: title of a poem of eddas.reader.poetic_edda_titles
+    :param directory: directory of the annotation files
+    :return: path to the annotation file of the poem, the one named after legacy_poem_identifier if it is the only
+    one which exists
+    """
+    filename = os.path.join(directory, poem_identifier(title) + ANNOTATION_SUFFIX)
+    legacy_filename = os.path.join(directory, legacy_poem_identifier(title) + ANNOTATION_SUFFIX)
+    if not os.path.exists(filename) and os.path.exists(legacy_filename):
+        return legacy_filename
+    return filename
+
+
+def read_poem_stanzas(title: str) -> list:
+    """
+    :param title: title of a poem of eddas.reader.poetic_edda_titles
+    :return: its stanzas, each stanza being a list of the (forms, lemmata, tags) of its lines
+    :raise ValueError: if the lemmatized and the POS-tagged texts do not have the same stanzas, lines and words
+    """
+    from eddas import reader
+
+    lemmatized_paras = list(reader.PoeticEddaLemmatizationReader(title).tagged_paras())
+    pos_paras = list(reader.PoeticEddaPOSTaggedReader(title).tagged_paras())
+    check_same_length(title, "stanzas", lemmatized_paras, pos_paras)
+    stanzas = []
+    for i, (lemmatized_para, pos_para) in enumerate(zip(lemmatized_paras, pos_paras), 1):
+        check_same_length(title, "lines in stanza {}".format(i), lemmatized_para, pos_para)
+        for j, (lemmatized_line, pos_line) in enumerate(zip(lemmatized_para, pos_para), 1):
+            check_same_length(title, "words in line {} of stanza {}".format(j, i), lemmatized_line, pos_line)
+        stanzas.append([([word for word, _ in lemmatized_line], [lemma for _, lemma in lemmatized_line],
+                         [tag for _, tag in pos_line])
+                        for lemmatized_line, pos_line in zip(lemmatized_para, pos_para)])
+    return stanzas
+
+
+def check_same_length(title: str, what: str, lemmatized, pos_tagged):
+    """
+    >>> check_same_length("Völuspá", "words", ["Hljóðs", "bið"], ["Hljóðs"])
+    Traceback (most recent call last):
+    ...
+    ValueError: Völuspá: 2 lemmatized words but 1 POS-tagged
+
+    :param title: title of the poem
+    :param what: what is counted, for the error message
+    :param lemmatized: items of the lemmatized text
+    :param pos_tagged: the same items in the POS-tagged text
+    :raise ValueError: if their numbers differ, as the lemmata would then be paired with the wrong words
+    """
+    if len(lemmatized) != len(pos_tagged):
+        raise ValueError("{}: {} lemmatized {} but {} POS-tagged".format(title, len(lemmatized), what,
+                                                                       len(pos_tagged)))
+
+
+def annotate_poems(directory: str, titles=None) -> dict:
+    """
+    :param directory: directory of the annotation files
+    :param titles: titles of the poems, all the poems of the Poetic Edda by default
+    :return: number of decoded stanzas by title
+    """
+    if titles is None:
+        from eddas import reader
+        titles = reader.poetic_edda_titles
+    os.makedirs(directory, exist_ok=True)
+    return {title: annotate_incrementally(annotation_filename(title, directory), read_poem_stanzas(title))
+            for title in titles}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Writes the annotation files of the Poetic Edda incrementally.")
+    parser.add_argument("titles", nargs="*", help="titles of the poems, all the poems by default")
+    parser.add_argument("--output", default=".", help="directory of the annotation files")
+    args = parser.parse_args(argv)
+    for title, n_decoded in annotate_poems(args.output, args.titles or None).items():
+        print("{:<40} {:>5} decoded stanzas".format(title, n_decoded))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Linking of the lemmata of the Poetic Edda and of the Menota manuscripts to the entries of Zoëga's dictionary.
+
+Lemma columns are joined against zoega_index.HeadwordIndex: each distinct lemma is looked up once, whatever the
+number of tokens.
+
+$ python lexicon_linking.py Völuspá Hávamál
+"""
+import argparse
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from zoega_index import get_headword_index, normalize_headword
+
+__author__ = ["Clément Besnier <clemsciences@aol.com>", ]
+
+
+PUNCTUATIONS = "':?!.,;-"
+
+LinkReport = namedtuple("LinkReport", ["title", "hits", "misses", "coverage"])
+
+
+def is_lemma(lemma) -> bool:
+    """
+    >>> is_lemma("heimr"), is_lemma(""), is_lemma(","), is_lemma(None)
+    (True, False, False, False)
+    """
+    return bool(lemma) and lemma not in PUNCTUATIONS
+
+
+def join_lemmata(lemmata, index=None) -> np.ndarray:
+    """
+    >>> from zoega_index import HeadwordIndex, Headword
+    >>> index = HeadwordIndex([Headword("heimr"), Headword("hljóð")])
+    >>> join_lemmata(["HLJÓÐ", "bið", "", "HLJÓÐ"], index).tolist()
+    [1, -1, -1, 1]
+
+    :param lemmata: lemma column, as in PoeticEddaLemmatizationReader or TokenTable.lemma
+    :param index: HeadwordIndex, by default the one over all the entries of Zoëga's dictionary
+    :return: position in index.entries of the first entry of each lemma, -1 for the lemmata which are not found
+    """
+    if index is None:
+        index = get_headword_index()
+    unique_lemmata, inverse = np.unique(np.asarray([lemma or "" for lemma in lemmata], dtype=str),
+                                        return_inverse=True)
+    positions = np.full(len(unique_lemmata), -1, dtype=np.int64)
+    for i, lemma in enumerate(unique_lemmata.tolist()):
+        if is_lemma(lemma):
+            found = index.find_positions(lemma)
+            if found:
+                positions[i] = found[0]
+    return positions[inverse.reshape(-1)]
+
+
+def link_lemmata(title: str, lemmata, index=None) -> LinkReport:
+    """
+    >>> from zoega_index import HeadwordIndex, Headword
+    >>> index = HeadwordIndex([Headword("heimr"), Headword("hljóð")])
+    >>> report = link_lemmata("Völuspá", ["HLJÓÐ", "bið", ",", "hljóð"], index)
+    >>> sorted(report.hits), report.misses, report.coverage
+    (['hljóð'], ['bið'], 0.5)
+
+    :param title: name of the poem or of the manuscript
+    :param lemmata: lemma column
+    :param index: HeadwordIndex, by default the one over all the entries of Zoëga's dictionary
+    :return: hits (entries of each lemma found), misses (lemmata not found) and share of distinct lemmata found
+    """
+    if index is None:
+        index = get_headword_index()
+    lemmata = [normalize_headword(lemma) for lemma in lemmata if is_lemma(lemma)]
+    unique_lemmata = list(dict.fromkeys(lemmata))
+    positions = join_lemmata(unique_lemmata, index)
+    hits = {lemma: index.find(lemma) for lemma, position in zip(unique_lemmata, positions) if position >= 0}
+    misses = [lemma for lemma, position in zip(unique_lemmata, positions) if position < 0]
+    coverage = len(hits) / len(unique_lemmata) if unique_lemmata else 1.
+    return LinkReport(title, hits, misses, coverage)
+
+
+def lemma_pos(lemmata, store=None) -> dict:
+    """
+    :param lemmata: lemma column
+    :param store: ZoegaStore, by default the one built from all the entries of Zoëga's dictionary
+    :return: POS of the entries of each distinct lemma, an empty list for the lemmata which are not found
+    """
+    if store is None:
+        from zoega_store import get_store
+        store = get_store()
+    return store.pos_of(lemma for lemma in lemmata if is_lemma(lemma))
+
+
+def poem_lemmata(title: str) -> list:
+    """
+    :param title: title of a poem of eddas.reader.poetic_edda_titles
+    :return: lemma column of the poem
+    """
+    from eddas import reader
+
+    return [lemma for _, lemma in reader.PoeticEddaLemmatizationReader(title).tagged_words()]
+
+
+def manuscript_lemmata(filename: str) -> list:
+    """
+    :param filename: path to a Menota document
+    :return: lemma column of the manuscript
+    """
+    from menota_corpus import CACHE_DIRECTORY, load_manuscript
+
+    return load_manuscript(filename, CACHE_DIRECTORY).lemma
+
+
+def link_poems(titles=None, index=None) -> dict:
+    """
+    :param titles: titles of the poems, all the poems of the Poetic Edda by default
+    :param index: HeadwordIndex, by default the one over all the entries of Zoëga's dictionary
+    :return: LinkReport by title
+    """
+    if titles is None:
+        from eddas import reader
+        titles = reader.poetic_edda_titles
+    if index is None:
+        index = get_headword_index()
+    return {title: link_lemmata(title, poem_lemmata(title), index) for title in titles}
+
+
+def link_manuscripts(filenames, index=None) -> dict:
+    """
+    :param filenames: paths to Menota documents
+    :param index: HeadwordIndex, by default the one over all the entries of Zoëga's dictionary
+    :return: LinkReport by manuscript identifier
+    """
+    from menota_corpus import manuscript_identifier
+
+    if index is None:
+        index = get_headword_index()
+    reports = {}
+    for filename in filenames:
+        identifier = manuscript_identifier(filename)
+        reports[identifier] = link_lemmata(identifier, manuscript_lemmata(filename), index)
+    return reports
+
+
+def report_links(reports, stream=sys.stdout):
+    for report in reports:
+        stream.write("{:<40} {:>6} hits {:>6} misses {:>8.3f}\n".format(report.title, len(report.hits),
+                                                                        len(report.misses), report.coverage))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Links the lemmata of the Poetic Edda to Zoëga's dictionary.")
+    parser.add_argument("titles", nargs="*", help="titles of the poems, all the poems by default")
+    parser.add_argument("--manuscripts", nargs="*", default=[], help="paths to Menota documents")
+    args = parser.parse_args(argv)
+    reports = list(link_manuscripts(args.manuscripts).values()) if args.manuscripts else []
+    if args.titles or not args.manuscripts:
+        reports.extend(link_poems(args.titles or None).values())
+    report_links(reports)
+
+
+if __name__ == "__main__":
+    main()
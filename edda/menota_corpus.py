@@ -0,0 +1,241 @@
+"""
+Extraction and POS decoding of several Menota manuscripts in parallel.
+
+$ python menota_corpus.py ../menota
+"""
+import functools
+import hashlib
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import pos_menota
+from menota_reader import MENOTA_DIRECTORY, MENOTA_ENTITIES, iter_menota_words
+from pos_utils import FEATURE_NAMES
+
+__author__ = ["Clément Besnier <clemsciences@aol.com>", ]
+
+
+# Increment it when the extraction or the decoding changes, so that cached token tables are rebuilt.
+PARSER_VERSION = "5"
+CACHE_DIRECTORY = "token_cache"
+
+ManuscriptTiming = namedtuple("ManuscriptTiming", ["manuscript", "n_tokens", "seconds"])
+
+
+class TokenTable:
+    """
+    Columnar table of the words of one or several manuscripts.
+    String columns are lists, POS features are a boolean matrix with one row per token.
+    """
+    columns = ["manuscript", "stanza", "line", "word", "norm", "facs", "dipl", "lemma", "msa", "pos"]
+    integer_columns = ["line", "word"]
+    Row = namedtuple("Row", columns + ["features"])
+
+    def __init__(self, features=None, **columns):
+        for column in TokenTable.columns:
+            setattr(self, column, list(columns.get(column, [])))
+        if features is None:
+            features = pos_menota.parse_many(self.msa)
+        self.features = features
+
+    def __len__(self):
+        return len(self.norm)
+
+    def __getitem__(self, i) -> "TokenTable.Row":
+        return TokenTable.Row(*[getattr(self, column)[i] for column in TokenTable.columns], self.features[i])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @staticmethod
+    def from_words(manuscript: str, words) -> "TokenTable":
+        """
+        :param manuscript: manuscript identifier
+        :param words: iterable of MenotaWord
+        :return: table with the verbose POS and the features of each word
+        """
+        columns = {column: [] for column in TokenTable.columns}
+        for word in words:
+            columns["manuscript"].append(manuscript)
+            for column in word._fields:
+                columns[column].append(getattr(word, column))
+            columns["pos"].append(pos_menota.parse(word.msa))
+        return TokenTable(**columns)
+
+    @staticmethod
+    def concatenate(tables) -> "TokenTable":
+        tables = list(tables)
+        columns = {column: [value for table in tables for value in getattr(table, column)]
+                   for column in TokenTable.columns}
+        if tables:
+            features = np.concatenate([table.features for table in tables])
+        else:
+            features = np.zeros((0, len(FEATURE_NAMES)), dtype=bool)
+        return TokenTable(features=features, **columns)
+
+    def save(self, filename: str):
+        """
+        Writes the table in a compressed .npz file. Each string column is interned: its distinct values are stored
+        once and rows refer to them with integer codes. Missing values are stored as empty strings (-1 in the integer
+        columns), and flagged in a boolean column so that load restores them as None.
+
+        >>> import io
+        >>> table = TokenTable(stanza=["1", "1", None], line=[0, 0, None], word=[0, 1, None],
+        ...                    norm=["hljóðs", "bið", "ok"], lemma=["hljóð", None, "ok"],
+        ...                    msa=["xNC gN nS cG sI", None, "xCC"])
+        >>> f = io.BytesIO()
+        >>> table.save(f)
+        >>> _ = f.seek(0)
+        >>> loaded = TokenTable.load(f)
+        >>> loaded.lemma, loaded.line, loaded.msa == table.msa, bool((loaded.features == table.features).all())
+        (['hljóð', None, 'ok'], [0, 0, None], True, True)
+
+        :param filename: path to the .npz file
+        """
+        arrays = {"features": np.asarray(self.features, dtype=bool)}
+        for column in TokenTable.columns:
+            values = getattr(self, column)
+            if column in TokenTable.integer_columns:
+                arrays[column] = np.asarray([-1 if value is None else value for value in values], dtype=np.int32)
+            else:
+                strings, codes = np.unique(np.asarray([value or "" for value in values], dtype=str),
+                                           return_inverse=True)
+                arrays[column + "_strings"] = strings
+                arrays[column + "_codes"] = codes.reshape(-1).astype(np.uint32)
+            arrays[column + "_missing"] = np.asarray([value is None for value in values], dtype=bool)
+        np.savez_compressed(filename, **arrays)
+
+    @staticmethod
+    def load(filename: str) -> "TokenTable":
+        """
+        :param filename: path to a .npz file written by TokenTable.save
+        :return: the table
+        :raise ValueError: if the features of the file are not those of FEATURE_NAMES
+        """
+        with np.load(filename, allow_pickle=False) as arrays:
+            if arrays["features"].shape[1:] != (len(FEATURE_NAMES),):
+                raise ValueError("features of shape {} instead of {} columns".format(arrays["features"].shape,
+                                                                                     len(FEATURE_NAMES)))
+            columns = {}
+            for column in TokenTable.columns:
+                if column in TokenTable.integer_columns:
+                    values = arrays[column].tolist()
+                else:
+                    values = arrays[column + "_strings"][arrays[column + "_codes"]].tolist()
+                for i in np.flatnonzero(arrays[column + "_missing"]):
+                    values[i] = None
+                columns[column] = values
+            return TokenTable(features=arrays["features"], **columns)
+
+
+def cache_key(filename: str) -> str:
+    """
+    :param filename: path to a Menota document
+    :return: hash of PARSER_VERSION, of the content of the file and of the bundled entities, which define the
+    facs and dipl texts
+    """
+    digest = hashlib.sha256(PARSER_VERSION.encode("utf-8"))
+    for source in [filename, MENOTA_ENTITIES]:
+        with open(source, "rb") as f:
+            for block in iter(functools.partial(f.read, 1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def cached_table_filename(filename: str, cache_directory: str) -> str:
+    return os.path.join(cache_directory, "{}-{}.npz".format(manuscript_identifier(filename), cache_key(filename)[:16]))
+
+
+def manuscript_identifier(filename: str) -> str:
+    """
+    >>> manuscript_identifier("../menota/GKS-2365-4to-Vsp.xml")
+    'GKS-2365-4to-Vsp'
+
+    :param filename: path to a Menota document
+    :return: name of the file without extension
+    """
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def process_manuscript(filename: str, cache_directory=None):
+    """
+    Reads and decodes a manuscript. This is run in the worker processes.
+
+    :param filename: path to a Menota document
+    :param cache_directory: if given, the token table is loaded from there when the file and PARSER_VERSION
+    did not change, and saved there otherwise
+    :return: the token table of the manuscript and its timing
+    """
+    start = time.perf_counter()
+    manuscript = manuscript_identifier(filename)
+    if cache_directory is None:
+        table = TokenTable.from_words(manuscript, iter_menota_words(filename))
+    else:
+        table = load_manuscript(filename, cache_directory)
+    return table, ManuscriptTiming(manuscript, len(table), time.perf_counter() - start)
+
+
+def load_manuscript(filename: str, cache_directory=CACHE_DIRECTORY) -> TokenTable:
+    """
+    :param filename: path to a Menota document
+    :param cache_directory: directory of the cached token tables
+    :return: the token table, read from the cache without any XML parsing when possible
+    """
+    cached_filename = cached_table_filename(filename, cache_directory)
+    if os.path.exists(cached_filename):
+        try:
+            return TokenTable.load(cached_filename)
+        except ValueError:
+            # written with another feature layout, it is rebuilt
+            pass
+    table = TokenTable.from_words(manuscript_identifier(filename), iter_menota_words(filename))
+    os.makedirs(cache_directory, exist_ok=True)
+    table.save(cached_filename)
+    return table
+
+
+def list_manuscripts(directory: str):
+    """
+    :param directory: directory of Menota documents
+    :return: sorted paths of the XML files of the directory
+    """
+    return sorted(os.path.join(directory, filename) for filename in os.listdir(directory)
+                  if filename.endswith(".xml"))
+
+
+def process_manuscripts(filenames, max_workers=None, cache_directory=None):
+    """
+    Extracts the manuscripts in a pool of processes. Tables are merged in the order of the sorted manuscript
+    identifiers, whatever the order in which workers finish.
+
+    :param filenames: paths to Menota documents
+    :param max_workers: number of processes, by default the number of CPUs
+    :param cache_directory: directory of the cached token tables, None to disable the cache
+    :return: the merged token table and the timing of each manuscript
+    """
+    filenames = sorted(filenames, key=manuscript_identifier)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(functools.partial(process_manuscript, cache_directory=cache_directory),
+                                    filenames))
+    tables = [table for table, _ in results]
+    timings = [timing for _, timing in results]
+    return TokenTable.concatenate(tables), timings
+
+
+def report_timings(timings, stream=sys.stdout):
+    for timing in timings:
+        stream.write("{:<30} {:>8} tokens {:>10.3f} s\n".format(timing.manuscript, timing.n_tokens, timing.seconds))
+    stream.write("{:<30} {:>8} tokens {:>10.3f} s\n".format("total", sum(timing.n_tokens for timing in timings),
+                                                            sum(timing.seconds for timing in timings)))
+
+
+if __name__ == "__main__":
+    table, timings = process_manuscripts(list_manuscripts(sys.argv[1] if len(sys.argv) > 1 else MENOTA_DIRECTORY),
+                                         cache_directory=CACHE_DIRECTORY)
+    report_timings(timings)
@@ -0,0 +1,164 @@
+"""
+Streaming reader of Menota TEI documents.
+
+Words are read one by one with lxml.etree.iterparse, so the memory used does not depend on the size of the manuscript.
+
+By default the entities are read from menota/menota-entities.txt, so that documents are parsed offline. This file
+is not a copy of the Menota entity set: it only declares the entities of the bundled manuscripts, and writes the
+characters which MUFI puts in the Private Use Area as a base letter followed by standard combining marks. The facs
+and dipl texts are thus normalized. Give entities=None to load the definitions of www.menota.org instead, or the
+path to a local copy of them.
+"""
+import functools
+import os
+from collections import namedtuple
+
+from lxml import etree
+
+__author__ = ["Clément Besnier <clemsciences@aol.com>", ]
+
+TEI_NAMESPACE = "http://www.tei-c.org/ns/1.0"
+MENOTA_NAMESPACE = "http://www.menota.org/ns/1.0"
+
+namespaces = {'n': TEI_NAMESPACE,
+              'me': MENOTA_NAMESPACE}
+
+STANZA_TAG = "{%s}lg" % TEI_NAMESPACE
+LINE_TAG = "{%s}l" % TEI_NAMESPACE
+WORD_TAG = "{%s}w" % TEI_NAMESPACE
+MSA_ATTRIBUTE = "{%s}msa" % MENOTA_NAMESPACE
+
+MENOTA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "menota")
+# Normalized subset of the Menota entities, see the docstring of the module
+MENOTA_ENTITIES = os.path.join(MENOTA_DIRECTORY, "menota-entities.txt")
+
+MenotaWord = namedtuple("MenotaWord", ["stanza", "line", "word", "norm", "facs", "dipl", "lemma", "msa"])
+
+stringify = etree.XPath("string()")
+find_levels = {level: etree.XPath("me:%s" % level, namespaces=namespaces) for level in ["norm", "facs", "dipl"]}
+
+
+def read_level(word, level: str) -> str:
+    """
+    :param word: n:w element
+    :param level: norm, facs or dipl
+    :return: text of the transcription level, an empty string if it is missing
+    """
+    elements = find_levels[level](word)
+    if elements:
+        return stringify(elements[0])
+    return ""
+
+
+class MenotaEntityResolver(etree.Resolver):
+    """
+    Serves a local file instead of the entity set which Menota documents load from www.menota.org,
+    so that they are parsed with no_network=True.
+    """
+    urls = ["http://www.menota.org/menota-entities.txt", "https://www.menota.org/menota-entities.txt"]
+
+    def __init__(self, entities=MENOTA_ENTITIES):
+        """
+        :param entities: path to the entity definitions, by default the normalized subset of menota-entities.txt
+        """
+        super().__init__()
+        self.catalog = {url: entities for url in MenotaEntityResolver.urls}
+
+    def resolve(self, system_url, public_id, context):
+        filename = self.catalog.get(system_url)
+        if filename is not None:
+            return self.resolve_filename(filename, context)
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_menota_parser(entities=MENOTA_ENTITIES) -> etree.XMLParser:
+    """
+    :param entities: path to the entity definitions, None to load them from www.menota.org
+    :return: a parser shared by all the Menota documents, which only accesses the network if entities is None
+    """
+    parser = etree.XMLParser(load_dtd=True, no_network=entities is not None, resolve_entities=True)
+    if entities is not None:
+        parser.resolvers.add(MenotaEntityResolver(entities))
+    return parser
+
+
+def parse_menota(source, entities=MENOTA_ENTITIES) -> etree._ElementTree:
+    """
+    :param source: filename or file object of a Menota document
+    :param entities: path to the entity definitions, None to load them from www.menota.org
+    :return: the parsed document
+    """
+    return etree.parse(source, parser=get_menota_parser(entities))
+
+
+def iter_menota_words(source, resolvers=None, entities=MENOTA_ENTITIES, verse_only=False, **parser_options):
+    """
+    Yields a MenotaWord for each n:w element of the document.
+    Stanzas (n:lg) are identified by their n attribute, lines (n:l) and words by their position (from 0) in their
+    stanza and line. Words outside the lines of the stanzas, like those of prose passages, have None as line and word,
+    and as stanza if they are not in a stanza.
+    Each element is cleared once it has been read.
+    With the default entities, the facs and dipl texts are normalized (see the docstring of the module).
+
+    >>> import io
+    >>> document = io.BytesIO(b'<TEI xmlns="http://www.tei-c.org/ns/1.0"><p><w lemma="ok"/></p>'
+    ...                       b'<lg n="1"><l><w lemma="heimr"/><w lemma="vera"/></l></lg></TEI>')
+    >>> [(word.stanza, word.line, word.word, word.lemma) for word in iter_menota_words(document)]
+    [(None, None, None, 'ok'), ('1', 0, 0, 'heimr'), ('1', 0, 1, 'vera')]
+    >>> _ = document.seek(0)
+    >>> [word.lemma for word in iter_menota_words(document, verse_only=True)]
+    ['heimr', 'vera']
+
+    :param source: filename or file object of a Menota document
+    :param resolvers: lxml.etree.Resolver instances used to load the DTD and the entity sets,
+    by default a MenotaEntityResolver of entities
+    :param entities: path to the entity definitions, None to load them from www.menota.org
+    :param verse_only: if True, only the words in the lines of the stanzas are yielded
+    :param parser_options: keyword arguments given to lxml.etree.iterparse
+    :return: generator of MenotaWord
+    """
+    if resolvers is None:
+        resolvers = [MenotaEntityResolver(entities)] if entities is not None else []
+    options = dict(load_dtd=True, no_network=entities is not None, resolve_entities=True)
+    options.update(parser_options)
+    context = etree.iterparse(source, events=("start", "end"), tag=(STANZA_TAG, LINE_TAG, WORD_TAG), **options)
+    for resolver in resolvers:
+        context.resolvers.add(resolver)
+
+    stanza = None
+    n_stanzas = 0
+    line_index = -1
+    word_index = -1
+    in_line = False
+    for event, element in context:
+        if event == "start":
+            if element.tag == STANZA_TAG:
+                stanza = element.get("n", str(n_stanzas + 1))
+                n_stanzas += 1
+                line_index = -1
+            elif element.tag == LINE_TAG and stanza is not None:
+                line_index += 1
+                word_index = -1
+                in_line = True
+            continue
+
+        if element.tag == WORD_TAG:
+            if in_line:
+                word_index += 1
+                yield MenotaWord(stanza, line_index, word_index,
+                                 read_level(element, "norm"), read_level(element, "facs"),
+                                 read_level(element, "dipl"), element.get("lemma"), element.get(MSA_ATTRIBUTE))
+            elif not verse_only:
+                yield MenotaWord(stanza, None, None,
+                                 read_level(element, "norm"), read_level(element, "facs"),
+                                 read_level(element, "dipl"), element.get("lemma"), element.get(MSA_ATTRIBUTE))
+        elif element.tag == LINE_TAG:
+            in_line = False
+        elif element.tag == STANZA_TAG:
+            stanza = None
+
+        element.clear(keep_tail=True)
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+    del context
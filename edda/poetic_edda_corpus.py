@@ -0,0 +1,159 @@
+"""
+POS and lemma decoding of all the poems of eddas.reader in parallel workers.
+
+Each poem is written in its own .npz file (words, lemmata, tags and the boolean feature matrix of the tags) and
+index.json lists the poems with the rows they take in the concatenation of all the matrices.
+
+$ python poetic_edda_corpus.py --output poetic_edda_features --workers 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from incremental_annotation import check_same_length, poem_identifier
+from pos_icepahc import parse_many_icepahc
+
+__author__ = ["Clément Besnier <clemsciences@aol.com>", ]
+
+
+INDEX_FILENAME = "index.json"
+EXECUTORS = {"process": ProcessPoolExecutor, "thread": ThreadPoolExecutor}
+
+PoemTiming = namedtuple("PoemTiming", ["title", "n_tokens", "seconds"])
+PoemEntry = namedtuple("PoemEntry", ["title", "filename", "start", "stop"])
+
+
+def read_poem(title: str):
+    """
+    :param title: title of a poem of eddas.reader.poetic_edda_titles
+    :return: words, lemmata and IcePaHC tags of the poem
+    :raise ValueError: if the lemmatized and the POS-tagged texts do not have the same number of words
+    """
+    from eddas import reader
+
+    pos_words = list(reader.PoeticEddaPOSTaggedReader(title).tagged_words())
+    lemmatized_words = list(reader.PoeticEddaLemmatizationReader(title).tagged_words())
+    check_same_length(title, "words", lemmatized_words, pos_words)
+    words = [word for word, _ in pos_words]
+    tags = [tag for _, tag in pos_words]
+    lemmata = [lemma for _, lemma in lemmatized_words]
+    return words, lemmata, tags
+
+
+def save_poem(filename: str, words, lemmata, tags, features):
+    np.savez(filename, words=np.asarray(words, dtype=str), lemmata=np.asarray(lemmata, dtype=str),
+             tags=np.asarray(tags, dtype=str), features=np.asarray(features, dtype=bool))
+
+
+def load_poem(filename: str) -> dict:
+    """
+    :param filename: .npz file written by process_poem
+    :return: arrays of the poem, indexed by words, lemmata, tags and features
+    """
+    with np.load(filename, allow_pickle=False) as arrays:
+        return {name: arrays[name] for name in arrays.files}
+
+
+def process_poem(title: str, directory: str):
+    """
+    Reads, decodes and writes a poem. This is run in the workers.
+
+    :param title: title of a poem of eddas.reader.poetic_edda_titles
+    :param directory: output directory
+    :return: name of the written file and timing
+    """
+    start = time.perf_counter()
+    words, lemmata, tags = read_poem(title)
+    features = parse_many_icepahc(tags)
+    filename = poem_identifier(title) + ".npz"
+    save_poem(os.path.join(directory, filename), words, lemmata, tags, features)
+    return filename, PoemTiming(title, len(words), time.perf_counter() - start)
+
+
+def write_index(directory: str, entries):
+    with open(os.path.join(directory, INDEX_FILENAME), "w", encoding="utf-8") as f:
+        json.dump([entry._asdict() for entry in entries], f, ensure_ascii=False, indent=1)
+
+
+def load_index(directory: str) -> list:
+    """
+    :param directory: output directory of process_poems
+    :return: PoemEntry list, in the order of the titles
+    """
+    with open(os.path.join(directory, INDEX_FILENAME), encoding="utf-8") as f:
+        return [PoemEntry(**entry) for entry in json.load(f)]
+
+
+def report_progress(done: int, total: int, timing: PoemTiming, stream=sys.stderr):
+    stream.write("\r[{:>3}/{:>3}] {:<40.40} {:>8.3f} s".format(done, total, timing.title, timing.seconds))
+    if done == total:
+        stream.write("\n")
+    stream.flush()
+
+
+def process_poems(directory: str, titles=None, max_workers=None, executor="process", progress=True):
+    """
+    Processes the poems in a pool of workers, and writes the merged index once they are all done.
+
+    :param directory: output directory
+    :param titles: titles of the poems, all the poems of the Poetic Edda by default
+    :param max_workers: number of workers, by default the number of CPUs
+    :param executor: "process" or "thread"
+    :param progress: if True, the poems are reported on stderr as they are done
+    :return: PoemEntry list and PoemTiming list, in the order of the titles
+    """
+    if titles is None:
+        from eddas import reader
+        titles = reader.poetic_edda_titles
+    titles = list(titles)
+    os.makedirs(directory, exist_ok=True)
+
+    results = {}
+    with EXECUTORS[executor](max_workers=max_workers) as pool:
+        futures = {pool.submit(process_poem, title, directory): title for title in titles}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            if progress:
+                report_progress(len(results), len(titles), results[futures[future]][1])
+
+    entries = []
+    timings = []
+    start = 0
+    for title in titles:
+        filename, timing = results[title]
+        entries.append(PoemEntry(title, filename, start, start + timing.n_tokens))
+        timings.append(timing)
+        start += timing.n_tokens
+    write_index(directory, entries)
+    return entries, timings
+
+
+def report_timings(timings, stream=sys.stdout):
+    """
+    Writes the timing of each poem, the slowest first.
+    """
+    for timing in sorted(timings, key=lambda timing: timing.seconds, reverse=True):
+        stream.write("{:<40} {:>8} tokens {:>10.3f} s\n".format(timing.title, timing.n_tokens, timing.seconds))
+    stream.write("{:<40} {:>8} tokens {:>10.3f} s\n".format("total", sum(timing.n_tokens for timing in timings),
+                                                            sum(timing.seconds for timing in timings)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decodes the POS tags and the lemmata of the Poetic Edda.")
+    parser.add_argument("titles", nargs="*", help="titles of the poems, all the poems by default")
+    parser.add_argument("--output", default="poetic_edda_features", help="output directory")
+    parser.add_argument("--workers", type=int, default=None, help="number of workers")
+    parser.add_argument("--executor", default="process", choices=sorted(EXECUTORS))
+    args = parser.parse_args(argv)
+    _, timings = process_poems(args.output, args.titles or None, args.workers, args.executor)
+    report_timings(timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Throughput of the POS tag decoders.
+
+$ python pos_benchmarks.py
+"""
+import os
+import timeit
+
+import numpy as np
+
+import pos_icepahc
+import pos_menota
+from menota_reader import MENOTA_DIRECTORY, iter_menota_words
+from pos_utils import FEATURE_NAMES, POSFeatures
+
+__author__ = ["Clément Besnier <clemsciences@aol.com>", ]
+
+
+def report(name: str, n_tags: int, seconds: float):
+    print("{:<40} {:>12.0f} tags/s".format(name, n_tags / seconds))
+
+
+def benchmark_icepahc_decoder(repeat=5, number=10):
+    tags = pos_icepahc.POSIcePaHC.generate_all_possible_tags()
+    decoder = pos_icepahc.get_decoder()
+
+    def current_verbose():
+        for tag in tags:
+            pos_icepahc.POSIcePaHC.parse(tag)
+
+    def current_vector():
+        for tag in tags:
+            pos_icepahc.POSIcePaHC.parse(tag, True)
+
+    def compiled_verbose():
+        for tag in tags:
+            decoder.parse(tag)
+
+    def compiled_vector():
+        for tag in tags:
+            decoder.parse(tag, True)
+
+    def bitmask():
+        for tag in tags:
+            pos_icepahc.parse_icepahc_bits(tag)
+
+    buffer = np.zeros(len(FEATURE_NAMES), dtype=bool)
+
+    def into_buffer():
+        for tag in tags:
+            pos_icepahc.parse_icepahc_into(tag, buffer)
+
+    for name, function in [("POSIcePaHC.parse", current_verbose),
+                           ("POSIcePaHC.parse vector", current_vector),
+                           ("IcePaHCDecoder.parse", compiled_verbose),
+                           ("IcePaHCDecoder.parse vector", compiled_vector),
+                           ("parse_icepahc_bits", bitmask),
+                           ("parse_icepahc_into", into_buffer)]:
+        seconds = min(timeit.repeat(function, repeat=repeat, number=number))
+        report(name, len(tags) * number, seconds)
+
+
+def decode_menota_in_two_passes(full_tag, vector=False):
+    """
+    Reconstruction of the two-pass decoding which POSMenota used before its grammar was precompiled: the layout of
+    the word class is scanned once by POSMenota.apply and once more by POSMenota.binarize. It takes the slots of the
+    current GRAMMAR instead of the elif chain which was replaced, so it measures the cost of the second pass, not the
+    speed of the former decoder.
+    """
+    tags = full_tag.split(pos_menota.DELIMITER)[0].split(" ")
+    word_class = tags[0][1:]
+    rule = pos_menota.GRAMMAR.get(word_class, pos_menota.GrammarRule((), {}))
+    parsers = list(rule.slots.values())
+    value = pos_menota.POSMenota.apply(tags[1:], parsers, pos_menota.POSMenota.verbose.get(word_class, ""))
+    features = pos_menota.POSMenota.binarize(tags[1:], parsers, POSFeatures())
+    return features if vector else value
+
+
+def benchmark_menota_grammar(filename=None, repeat=5, number=10):
+    """
+    Decodes every me:msa value of a Menota document, by default the Codex Regius.
+    """
+    if filename is None:
+        filename = os.path.join(MENOTA_DIRECTORY, "GKS-2365-4to-Vsp.xml")
+    tags = [word.msa for word in iter_menota_words(filename) if word.msa]
+
+    def two_passes():
+        for tag in tags:
+            decode_menota_in_two_passes(tag)
+            decode_menota_in_two_passes(tag, True)
+
+    def compiled_grammar():
+        for tag in tags:
+            pos_menota.POSMenota.parse(tag)
+            pos_menota.POSMenota.parse(tag, True)
+
+    for name, function in [("apply + binarize (reconstruction)", two_passes),
+                           ("POSMenota.parse (compiled grammar)", compiled_grammar)]:
+        seconds = min(timeit.repeat(function, repeat=repeat, number=number))
+        report(name, len(tags) * number, seconds)
+
+
+if __name__ == "__main__":
+    benchmark_icepahc_decoder()
+    benchmark_menota_grammar()
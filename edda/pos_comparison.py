@@ -1,10 +1,13 @@
 """
+Comparison of the Menota and the IcePaHC annotations of the Völuspá.
 
+Importing this module does not read any corpus, the work is done by the command line:
+
+$ python pos_comparison.py --manuscript ../menota/GKS-2365-4to-Vsp.xml --output comparison_results --format txt
 """
+import argparse
 import codecs
-
-from eddas import reader
-
+import os
 
 import pos_icepahc
 import pos_menota
@@ -14,95 +17,154 @@ __author__ = ["Clément Besnier <clemsciences@aol.com>", ]
 
 # region menota
 
-import os
-from lxml import etree
+directory_results = "comparison_results"
 
-namespaces = {'n': 'http://www.tei-c.org/ns/1.0',
-              'me': 'http://www.menota.org/ns/1.0'}
+menota_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "menota")
+konungsbok_filename = os.path.join(menota_directory, "GKS-2365-4to-Vsp.xml")
+# hausbok_filename = os.path.join(menota_directory, "AM-544-4to-Vsp.xml")
 
-directory_results = "comparison_results"
+OUTPUT_FORMATS = ["txt", "csv", "npz"]
+
+
+def extract_menota_tokens(filename=konungsbok_filename):
+    """
+    :param filename: path to a Menota document, by default the Codex Regius
+    :return: list of MenotaWord, one by n:w element
+    """
+    from menota_reader import iter_menota_words
+
+    return list(iter_menota_words(filename))
+
+
+def extract_words_for_comparison_menota(filename=konungsbok_filename, directory=directory_results):
+    """
+    Writes the normalized words of a Menota document in text_menota.txt.
+
+    :param filename: path to a Menota document, by default the Codex Regius
+    :param directory: output directory
+    :return: list of MenotaWord
+    """
+    tokens = extract_menota_tokens(filename)
+    os.makedirs(directory, exist_ok=True)
+    with codecs.open(os.path.join(directory, "text_menota.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(token.norm for token in tokens))
+    return tokens
 
-if not os.path.exists(directory_results):
-    os.mkdir(directory_results)
-
-
-def get_menota_stanzas():
-    konungsbok_filename = "GKS-2365-4to-Vsp.xml"
-    # hausbok_filename = "AM-544-4to-Vsp.xml"
-    menota_directory = "../menota"
-
-    parser = etree.XMLParser(load_dtd=True, no_network=False)
-    tree = etree.parse(os.path.join(menota_directory, konungsbok_filename), parser=parser)
-    root = tree.getroot()
-
-    header, text = root.getchildren()
-    poem = text.getchildren()[0].getchildren()[3]
-    stanzas = [child for child in poem.xpath("n:lg", namespaces=namespaces)]
-    return stanzas
-
-
-def extract_words_for_comparison_menota():
-    stringify = etree.XPath("string()")
-    stanzas = get_menota_stanzas()
-
-    normalized_stanzas = [stanza.findall(".//n:l", namespaces=namespaces) for stanza in stanzas]
-    normalized_lines = [[line.findall(".//me:norm", namespaces=namespaces) for line in stanza]
-                        for stanza in normalized_stanzas]
-    normalized_text = [[[stringify(word) for word in line] for line in stanza] for stanza in normalized_lines]
-
-    lemmata_stanzas = [stanza.findall(".//n:l", namespaces=namespaces) for stanza in stanzas]
-    lemmata_lines = [[line.findall(".//n:w", namespaces=namespaces) for line in stanza] for stanza in lemmata_stanzas]
-    lemmata_text = [[[word.get("lemma") for word in line] for line in stanza] for stanza in lemmata_lines]
-
-    pos_stanzas = [stanza.findall(".//n:l", namespaces=namespaces) for stanza in stanzas]
-    pos_lines = [[line.findall(".//n:w", namespaces=namespaces) for line in stanza] for stanza in pos_stanzas]
-    pos_text = [[[word.get('{http://www.menota.org/ns/1.0}msa') for word in line] for line in stanza]
-                for stanza in pos_lines]
-    #
-    menota_tags = []
-    text1 = []
-    # for i, stanza in enumerate([pos_text[0]]):
-    for i, stanza in enumerate(pos_text):
-        for j, line in enumerate(stanza):
-            for k, pos in enumerate(line):
-                try:
-                    menota_tags.append((normalized_text[i][j][k], pos_menota.parse(pos, True)))
-                    text1.append(normalized_text[i][j][k])
-                except IndexError:
-                    print(i, j, k, pos_text[i][j], normalized_text[i][j])
-                # print(normalized_text[i][j][k]+" ["+lemmata_text[i][j][k]+"]"+" : "+pos)
-
-    print(len(menota_tags))
-    with codecs.open(os.path.join(directory_results, "text_menota.txt"), "w", encoding="utf-8") as f:
-        f.write("\n".join(text1))
-
-
-extract_words_for_comparison_menota()
 # endregion
 
 
 # region icepahc
 
-def extract_words_for_comparison_icepahc():
-    # print(reader.poetic_edda_titles)
-    pos_reader_clkt = reader.PoeticEddaPOSTaggedReader("Völuspá")
-    # print(pos_reader_clkt.tagged_paras()[0])
+def extract_words_for_comparison_icepahc(directory=directory_results, n_first_tags=20):
+    """
+    Writes the words of the IcePaHC annotation of the Völuspá in text_icepahc.txt.
+
+    :param directory: output directory
+    :param n_first_tags: number of the first (word, features) pairs to return
+    :return: the first (word, features) pairs and the number of words
+    """
+    from pos_pipeline import decode_tags, filter_punctuation, read_tagged_tokens
+
+    os.makedirs(directory, exist_ok=True)
+    first_tags = []
+    n_tags = 0
+    with codecs.open(os.path.join(directory, "text_icepahc.txt"), "w", encoding="utf-8") as f:
+        for token in decode_tags(filter_punctuation(read_tagged_tokens(["Völuspá"])), vector=True):
+            if n_tags > 0:
+                f.write("\n")
+            f.write(token.word)
+            if len(first_tags) < n_first_tags:
+                first_tags.append((token.word, token.analysis))
+            n_tags += 1
+    return first_tags, n_tags
+
+# endregion
+
+
+# region comparison
+
+def universal_agreement(menota_tags, icepahc_tags):
+    """
+    >>> universal_agreement(["xNC gN nS cG sI", "xVB fF tPS mIN p1 nS vA iST"], ["NHEE", "LVFOSF"]).tolist()
+    [True, False]
 
-    icepahc_tags = []
-    icepahc_text = []
-    for sents in pos_reader_clkt.tagged_paras():
-        # print(sents)
-        for sent in sents:
-            for word, tag in sent:
-                if tag.lower() not in ["ta", 'p', "", "-", "?", "-", ";", ".", ":", "!"]:
-                    icepahc_tags.append((word, pos_icepahc.parse_icepahc(tag, True)))
-                    icepahc_text.append(word)
+    :param menota_tags: me:msa values
+    :param icepahc_tags: IcePaHC tags of the same tokens
+    :return: boolean array, True where both annotations have the same universal tag
+    """
+    from tagset_conversion import get_converter, ICEPAHC, MENOTA, UNIVERSAL
 
-    with codecs.open(os.path.join(directory_results, "text_icepahc.txt"), "w", encoding="utf-8") as f:
-        f.write("\n".join(icepahc_text))
+    converter = get_converter()
+    return converter.convert_column(menota_tags, MENOTA, UNIVERSAL) == \
+        converter.convert_column(icepahc_tags, ICEPAHC, UNIVERSAL)
 
-    print(icepahc_tags[:20])
-    print(len(icepahc_tags))
+
+def compare_menota_icepahc(menota_tokens, icepahc_words, icepahc_tags):
+    """
+    Aligns the Menota tokens with the IcePaHC tokens and compares their annotations.
+
+    :param menota_tokens: MenotaWord list, as returned by extract_menota_tokens
+    :param icepahc_words: forms of the IcePaHC annotation
+    :param icepahc_tags: IcePaHC tags of these forms
+    :return: AgreementReport on the features, and the labels and confusion matrix of the universal tags
+    """
+    from annotation_agreement import compare_annotations, confusion_matrix
+    from tagset_conversion import get_converter, ICEPAHC, MENOTA, UNIVERSAL
+
+    menota_tags = [token.msa for token in menota_tokens]
+    report = compare_annotations([token.norm for token in menota_tokens], pos_menota.parse_many(menota_tags),
+                                 icepahc_words, pos_icepahc.parse_many_icepahc(icepahc_tags))
+    converter = get_converter()
+    menota_universal = converter.convert_column(menota_tags, MENOTA, UNIVERSAL)[report.alignment.left]
+    icepahc_universal = converter.convert_column(icepahc_tags, ICEPAHC, UNIVERSAL)[report.alignment.right]
+    return report, confusion_matrix(menota_universal, icepahc_universal)
 
 # endregion
 
+
+# region command line
+
+def write_menota_tokens(manuscript: str, directory: str, output_format: str) -> str:
+    """
+    :param manuscript: path to a Menota document
+    :param directory: output directory
+    :param output_format: txt (one normalized word by line), csv (all the columns) or npz (TokenTable.save)
+    :return: path to the written file
+    """
+    from menota_corpus import TokenTable, manuscript_identifier
+    from menota_reader import iter_menota_words
+
+    identifier = manuscript_identifier(manuscript)
+    os.makedirs(directory, exist_ok=True)
+    filename = os.path.join(directory, "{}.{}".format(identifier, output_format))
+    if output_format == "txt":
+        with codecs.open(filename, "w", encoding="utf-8") as f:
+            f.write("\n".join(word.norm for word in iter_menota_words(manuscript)))
+        return filename
+
+    table = TokenTable.from_words(identifier, iter_menota_words(manuscript))
+    if output_format == "npz":
+        table.save(filename)
+    else:
+        import csv
+        with codecs.open(filename, "w", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(TokenTable.columns)
+            for row in table:
+                writer.writerow(row[:len(TokenTable.columns)])
+    return filename
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extracts the POS annotations of a Menota manuscript.")
+    parser.add_argument("--manuscript", default=konungsbok_filename, help="path to a Menota XML file")
+    parser.add_argument("--output", default=directory_results, help="output directory")
+    parser.add_argument("--format", default="txt", choices=OUTPUT_FORMATS, dest="output_format")
+    args = parser.parse_args(argv)
+    print(write_menota_tokens(args.manuscript, args.output, args.output_format))
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion
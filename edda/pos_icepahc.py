@@ -7,13 +7,18 @@ ct for
 
 
 """
+import itertools
 from typing import Union
 
 __author__ = ["Clément Besnier <clemsciences@aol.com>", ]
 __license__ = "MIT License"
 
-from collections import defaultdict
-from pos_utils import POSFeatures, POSAbstract, POSElement
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+from pos_utils import POSFeatures, POSAbstract, POSElement, FEATURE_INDICES, FEATURE_NAMES, PackedPOSFeatures, \
+    TagCache, features_matrix
 
 
 class Gender(POSElement):
@@ -40,7 +45,7 @@ class Gender(POSElement):
         :param value:
         :return:
         """
-        return value + " " + Gender.verbose[tag]
+        return value + " " + Gender.verbose.get(tag, "")
 
     @staticmethod
     def can_apply(tag):
@@ -75,7 +80,7 @@ class Number(POSElement):
         :param value:
         :return:
         """
-        return value + " " + Number.verbose[tag]
+        return value + " " + Number.verbose.get(tag, "")
 
     @staticmethod
     def can_apply(tag):
@@ -116,7 +121,7 @@ class Case(POSElement):
         :param value:
         :return:
         """
-        return value + " " + Case.verbose[tag]
+        return value + " " + Case.verbose.get(tag, "")
 
     @staticmethod
     def can_apply(tag):
@@ -155,7 +160,7 @@ class Declension(POSElement):
         :param value:
         :return:
         """
-        return value + " " + Declension.verbose[tag]
+        return value + " " + Declension.verbose.get(tag, "")
 
     @staticmethod
     def can_apply(tag):
@@ -192,7 +197,7 @@ class Degree(POSElement):
         :param value:
         :return:
         """
-        return value + " " + Degree.verbose[tag]
+        return value + " " + Degree.verbose.get(tag, "")
 
     @staticmethod
     def can_apply(tag):
@@ -222,7 +227,7 @@ class ProperNoun(POSElement):
         >>> ProperNoun.parse("m", "")
         ' person'
         >>> ProperNoun.parse("ö", "")
-        " place'
+        ' place'
         >>> ProperNoun.parse("s", "")
         ' other'
 
@@ -230,7 +235,7 @@ class ProperNoun(POSElement):
         :param value:
         :return:
         """
-        return value + " " + ProperNoun.verbose[tag]
+        return value + " " + ProperNoun.verbose.get(tag, "")
 
     @staticmethod
     def can_apply(tag):
@@ -283,7 +288,7 @@ class Pronoun(POSElement):
         :param value:
         :return:
         """
-        return value + " " + Pronoun.verbose[tag]
+        return value + " " + Pronoun.verbose.get(tag, "")
 
     @staticmethod
     def can_apply(tag):
@@ -325,7 +330,7 @@ class Person(POSElement):
         :param value:
         :return:
         """
-        return value + " " + Person.verbose[tag]
+        return value + " " + Person.verbose.get(tag, "")
 
     @staticmethod
     def can_apply(tag):
@@ -359,7 +364,7 @@ class NumberCategory(POSElement):
         :param value:
         :return:
         """
-        return value + " " + NumberCategory.verbose[tag]
+        return value + " " + NumberCategory.verbose.get(tag, "")
 
     @staticmethod
     def can_apply(tag):
@@ -411,7 +416,7 @@ class Mood(POSElement):
         :param value:
         :return:
         """
-        return value + " " + Mood.verbose[tag]
+        return value + " " + Mood.verbose.get(tag, "")
 
     @staticmethod
     def can_apply(tag):
@@ -447,7 +452,7 @@ class Voice(POSElement):
         :param value:
         :return:
         """
-        return value + " " + Voice.verbose[tag]
+        return value + " " + Voice.verbose.get(tag, "")
 
     @staticmethod
     def can_apply(tag):
@@ -472,15 +477,15 @@ class Tense(POSElement):
     def parse(tag, value):
         """
         >>> Tense.parse("n", "")
-        'present"
+        ' present'
         >>> Tense.parse("þ", "")
-        'past'
+        ' past'
 
         :param tag:
         :param value:
         :return:
         """
-        return value + " " + Tense.verbose[tag]
+        return value + " " + Tense.verbose.get(tag, "")
 
     @staticmethod
     def can_apply(tag):
@@ -572,7 +577,7 @@ class POSIcePaHC(POSAbstract):
         :return:
         """
         value = ""
-        features = POSFeatures
+        features = POSFeatures()
         if tag[0] == POSIcePaHC.noun:
             features.noun = True
             if len(tag) >= 4:
@@ -585,6 +590,7 @@ class POSIcePaHC(POSAbstract):
                     features = ProperNoun.binarize(tag[4], features)
 
         elif tag[0] == POSIcePaHC.adjective:
+            features.adjective = True
             if len(tag) == 6:
                 parsers = [Gender, Number, Case, Declension, Degree]
                 value = POSIcePaHC.verbose[tag[0]]
@@ -599,6 +605,7 @@ class POSIcePaHC(POSAbstract):
                 features = POSIcePaHC.binarize(tag, parsers, features)
 
         elif tag[0] == POSIcePaHC.article:
+            features.article = True
             if len(tag) == 4:
                 parsers = [Gender, Number, Case]
                 value = POSIcePaHC.verbose[tag[0]]
@@ -722,7 +729,7 @@ class POSIcePaHC(POSAbstract):
     @staticmethod
     def generate_all_possible_tags():
         """
-        TODO correct it because this should not return a list whose length is equal to 1249!
+        Some of these tags are not valid, see iter_valid_tags and TagInventory for the deduplicated valid tags.
 
         >>> len(POSIcePaHC.generate_all_possible_tags())
         1249
@@ -776,35 +783,473 @@ class POSIcePaHC(POSAbstract):
 
     @staticmethod
     def binarize(tag: str, l_pos: list, value: POSFeatures) -> POSFeatures:
-        #         print(tag)
-        i = 0
-        new_value = value
+        i = 1
         for pos in l_pos:
-            # print(pos)
             if isinstance(pos, list):
                 for j in pos:
-                    if j.can_apply(tag[i][1:]):
-                        new_value = j.binarize(tag[i], value)
-            elif i < len(tag):
-                #                 print(tag[i])
-                new_value = pos.binarize(tag[i][1:], value)
-            #                 print(repr(value))
-            value = new_value
+                    if j.can_apply(tag[i]):
+                        value = j.binarize(tag[i], value)
+            else:
+                value = pos.binarize(tag[i], value)
             i += 1
         return value
 
 
+DecodedTag = namedtuple("DecodedTag", ["verbose", "features"])
+
+
+class IcePaHCDecoder:
+    """
+    Precompiled decoder: every tag of POSIcePaHC.generate_all_possible_tags is decoded once
+    and stored in a dictionary. Tags which are not in the table are decoded by POSIcePaHC.parse.
+
+    >>> decoder = IcePaHCDecoder()
+    >>> decoder.parse('sfg3eþ')
+    'verb indicative active third singular past'
+    >>> decoder.parse('sfg3eþ', True) == POSIcePaHC.parse('sfg3eþ', True).vectorize()
+    True
+    >>> decoder.decode('cc').verbose
+    'conjunction'
+
+    """
+    def __init__(self, tags=None):
+        if tags is None:
+            tags = POSIcePaHC.generate_all_possible_tags()
+        self.table = {tag: IcePaHCDecoder.decode_slowly(tag) for tag in tags}
+        # feature vectors as bitmasks and as rows of a boolean matrix, to decode without building any vector
+        self.bits = {tag: PackedPOSFeatures.from_vector(decoded.features).bits for tag, decoded in self.table.items()}
+        self.row_ids = {tag: i for i, tag in enumerate(self.table)}
+        self.rows = np.array([decoded.features for decoded in self.table.values()], dtype=bool).reshape(
+            len(self.table), len(FEATURE_NAMES))
+
+    @staticmethod
+    def decode_slowly(tag: str) -> DecodedTag:
+        return DecodedTag(POSIcePaHC.parse(tag), tuple(POSIcePaHC.parse(tag, True).vectorize()))
+
+    def decode(self, tag: str) -> DecodedTag:
+        """
+        :param tag: lower-cased IcePaHC tag
+        :return: immutable pair of the verbose form and the feature vector
+        """
+        decoded = self.table.get(tag)
+        if decoded is None:
+            decoded = IcePaHCDecoder.decode_slowly(tag)
+        return decoded
+
+    def decode_bits(self, tag: str) -> int:
+        """
+        :param tag: lower-cased IcePaHC tag
+        :return: feature vector as a bitmask, bit i being FEATURE_NAMES[i]
+        """
+        bits = self.bits.get(tag)
+        if bits is None:
+            bits = PackedPOSFeatures.from_vector(IcePaHCDecoder.decode_slowly(tag).features).bits
+        return bits
+
+    def decode_into(self, tag: str, out: np.ndarray) -> np.ndarray:
+        """
+        >>> buffer = np.zeros((2, len(FEATURE_NAMES)), dtype=bool)
+        >>> row = get_decoder().decode_into("nkee", buffer[1])
+        >>> bool(buffer[1, FEATURE_INDICES["noun"]]), bool(buffer[0].any())
+        (True, False)
+
+        :param tag: lower-cased IcePaHC tag
+        :param out: boolean array of length len(FEATURE_NAMES), usually a row of a caller's matrix
+        :return: out, where the feature vector of the tag was copied
+        """
+        row_id = self.row_ids.get(tag)
+        if row_id is None:
+            out[:] = IcePaHCDecoder.decode_slowly(tag).features
+        else:
+            out[:] = self.rows[row_id]
+        return out
+
+    def parse(self, tag: str, vector=False) -> Union[str, list]:
+        """
+        Same as POSIcePaHC.parse, except that the feature vector is returned instead of POSFeatures.
+
+        :param tag: lower-cased IcePaHC tag
+        :param vector:
+        :return:
+        """
+        decoded = self.decode(tag)
+        if vector:
+            return list(decoded.features)
+        return decoded.verbose
+
+
+_decoder = None
+
+
+def get_decoder() -> IcePaHCDecoder:
+    """
+    :return: the shared precompiled decoder, built on the first call
+    """
+    global _decoder
+    if _decoder is None:
+        _decoder = IcePaHCDecoder()
+    return _decoder
+
+
+# Characters allowed at each position of the valid tags. A position is either an element, whose verbose keys are
+# allowed, or a string of allowed characters.
+TAG_LAYOUTS = [
+    (POSIcePaHC.noun, Gender, Number, Case),
+    (POSIcePaHC.noun, Gender, Number, Case, ProperNoun),
+    (POSIcePaHC.adjective, Gender, Number, Case, Declension, Degree),
+    (POSIcePaHC.pronoun, Pronoun, Person, Number, Case),
+    (POSIcePaHC.pronoun, Pronoun, Gender, Number, Case),
+    (POSIcePaHC.article, Gender, Number, Case),
+    (POSIcePaHC.numeral, NumberCategory, Gender, Number, Case),
+    (POSIcePaHC.verb, Mood.infinitive, Voice),
+    (POSIcePaHC.verb, Mood.past_participle, Voice, Gender, Number, Case),
+    (POSIcePaHC.verb, "".join(mood for mood in Mood.verbose if mood != Mood.past_participle), Voice, Person, Number,
+     Tense),
+    (POSIcePaHC.adverb, "auoþe"),
+    (POSIcePaHC.conjunction, "ntc"),
+    (POSIcePaHC.foreign,),
+    (POSIcePaHC.unanalysed,),
+    (POSIcePaHC.punctuation,),
+]
+
+
+def iter_valid_tags(layouts=None):
+    """
+    Lazily generates the tags described by the layouts, without duplicates.
+
+    >>> tags = iter_valid_tags()
+    >>> next(tags), next(tags)
+    ('nken', 'nkeo')
+
+    :param layouts: by default TAG_LAYOUTS
+    :return: generator of tags
+    """
+    if layouts is None:
+        layouts = TAG_LAYOUTS
+    seen = set()
+    for layout in layouts:
+        positions = [position if isinstance(position, str) else list(position.verbose) for position in layout]
+        for characters in itertools.product(*positions):
+            tag = "".join(characters)
+            if tag not in seen:
+                seen.add(tag)
+                yield tag
+
+
+class TagInventory:
+    """
+    Deduplicated tags with dense integer identifiers, so that tag columns can be stored as uint16 arrays.
+    The inventory is only built when it is first used.
+
+    >>> inventory = TagInventory()
+    >>> len(inventory)
+    925
+    >>> inventory.tag(inventory.id('sfg3eþ'))
+    'sfg3eþ'
+    >>> codes = inventory.encode(['nkee', 'sfg3eþ', 'nkee', 'zz'])
+    >>> codes.dtype.name, int(codes[3]) == TagInventory.unknown_id
+    ('uint16', True)
+    >>> inventory.decode(codes)
+    ['nkee', 'sfg3eþ', 'nkee', None]
+
+    """
+    unknown_id = np.iinfo(np.uint16).max
+
+    def __init__(self, tags=None):
+        self.source = tags
+        self._tags = None
+        self._ids = None
+
+    def build(self):
+        if self._tags is None:
+            tags = []
+            ids = {}
+            for tag in self.source if self.source is not None else iter_valid_tags():
+                if tag not in ids:
+                    ids[tag] = len(tags)
+                    tags.append(tag)
+            if len(tags) >= TagInventory.unknown_id:
+                raise ValueError("too many tags for uint16 identifiers")
+            self._tags = tags
+            self._ids = ids
+        return self
+
+    @property
+    def tags(self) -> list:
+        return self.build()._tags
+
+    @property
+    def ids(self) -> dict:
+        return self.build()._ids
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __iter__(self):
+        return iter(self.tags)
+
+    def __contains__(self, tag):
+        return tag in self.ids
+
+    def id(self, tag: str) -> int:
+        return self.ids[tag]
+
+    def tag(self, tag_id: int) -> str:
+        return self.tags[tag_id]
+
+    def encode(self, tags) -> np.ndarray:
+        """
+        :param tags: lower-cased tags
+        :return: uint16 identifiers, unknown_id for tags not in the inventory
+        """
+        ids = self.ids
+        return np.fromiter((ids.get(tag, TagInventory.unknown_id) for tag in tags), dtype=np.uint16)
+
+    def decode(self, tag_ids) -> list:
+        """
+        :param tag_ids: identifiers
+        :return: tags, None for unknown_id
+        """
+        tags = self.tags
+        return [tags[tag_id] if tag_id != TagInventory.unknown_id else None for tag_id in tag_ids]
+
+
+_inventory = None
+
+
+def get_inventory() -> TagInventory:
+    """
+    :return: the shared inventory of the valid tags
+    """
+    global _inventory
+    if _inventory is None:
+        _inventory = TagInventory()
+    return _inventory
+
+
+class MalformedTagError(ValueError):
+    def __init__(self, tag: str, position: int, expected):
+        self.tag = tag
+        self.position = position
+        self.expected = expected
+        if position < len(tag):
+            message = "unexpected {!r} at position {} of tag {!r}".format(tag[position], position, tag)
+        else:
+            message = "tag {!r} ends at position {}".format(tag, position)
+        if expected:
+            message += ", expected one of {}".format(", ".join(repr(c) for c in sorted(expected)))
+        super().__init__(message)
+
+
+class _TrieNode:
+    __slots__ = ("children", "decoded")
+
+    def __init__(self):
+        self.children = {}
+        self.decoded = None
+
+
+class IcePaHCTrie:
+    """
+    Character trie of the valid IcePaHC tags. A tag is decoded in a single left-to-right scan and terminal nodes
+    hold the decoded tag, so decoding does not build any string.
+
+    >>> trie = IcePaHCTrie()
+    >>> trie.parse('sfg3eþ')
+    'verb indicative active third singular past'
+    >>> trie.decode('nkeem').features == IcePaHCDecoder.decode_slowly('nkeem').features
+    True
+    >>> trie.decode('nkxe')
+    Traceback (most recent call last):
+    ...
+    pos_icepahc.MalformedTagError: unexpected 'x' at position 2 of tag 'nkxe', expected one of 'e', 'f'
+    >>> trie.decode('lke')
+    Traceback (most recent call last):
+    ...
+    pos_icepahc.MalformedTagError: tag 'lke' ends at position 3, expected one of 'e', 'n', 'o', 'þ'
+
+    """
+    def __init__(self, layouts=None):
+        self.root = _TrieNode()
+        decoder = get_decoder()
+        for tag in iter_valid_tags(layouts):
+            self.insert(tag, decoder.decode(tag))
+
+    def insert(self, tag: str, decoded: DecodedTag):
+        node = self.root
+        for character in tag:
+            child = node.children.get(character)
+            if child is None:
+                child = node.children[character] = _TrieNode()
+            node = child
+        node.decoded = decoded
+
+    def decode(self, tag: str) -> DecodedTag:
+        """
+        :param tag: lower-cased IcePaHC tag
+        :return: immutable pair of the verbose form and the feature vector
+        :raise MalformedTagError: if the tag is not valid, with the position of the first wrong character
+        """
+        node = self.root
+        for position, character in enumerate(tag):
+            child = node.children.get(character)
+            if child is None:
+                raise MalformedTagError(tag, position, node.children.keys())
+            node = child
+        if node.decoded is None:
+            raise MalformedTagError(tag, len(tag), node.children.keys())
+        return node.decoded
+
+    def parse(self, tag: str, vector=False) -> Union[str, list]:
+        decoded = self.decode(tag)
+        if vector:
+            return list(decoded.features)
+        return decoded.verbose
+
+
+_trie = None
+
+
+def get_trie() -> IcePaHCTrie:
+    """
+    :return: the shared trie of the valid tags, built on the first call
+    """
+    global _trie
+    if _trie is None:
+        _trie = IcePaHCTrie()
+    return _trie
+
+
+_cache = None
+
+
+def enable_cache(maxsize=4096) -> TagCache:
+    """
+    Memoizes parse_icepahc. Cached feature vectors are returned as immutable PackedPOSFeatures.
+
+    >>> cache = enable_cache(maxsize=16)
+    >>> parse_icepahc("NKEE"), parse_icepahc("NKEE")
+    ('noun masculine singular genitive', 'noun masculine singular genitive')
+    >>> cache.stats()["hits"], cache.stats()["misses"]
+    (1, 1)
+    >>> disable_cache()
+
+    :param maxsize: maximum number of cached (tag, vector) pairs
+    :return: the cache, whose counters can be read with TagCache.stats
+    """
+    global _cache
+    _cache = TagCache(maxsize)
+    return _cache
+
+
+def disable_cache():
+    global _cache
+    _cache = None
+
+
+def cache_stats() -> dict:
+    """
+    :return: counters of the enabled cache, an empty dict if caching is disabled
+    """
+    return _cache.stats() if _cache is not None else {}
+
+
 def parse_icepahc(tag: str, vector=False):
+    """
+    >>> parse_icepahc("NKEE")
+    'noun masculine singular genitive'
+    >>> parse_icepahc("NKEE", True).noun
+    True
+    >>> parse_icepahc("CC", True).conjunction
+    True
+    >>> parse_icepahc("", True) == POSFeatures()
+    True
+
+    Every valid tag is decoded as POSIcePaHC.parse does:
+
+    >>> all(parse_icepahc(tag.upper(), True) == POSIcePaHC.parse(tag, True) for tag in get_inventory())
+    True
+    >>> all(parse_icepahc(tag.upper()) == POSIcePaHC.parse(tag) for tag in get_inventory())
+    True
+
+    :param tag: IcePaHC tag, in any case
+    :param vector: if True, the features are returned instead of the verbose form
+    :return: verbose form, or immutable PackedPOSFeatures
+    """
+    if _cache is not None:
+        return _cache.get_or_parse((tag, vector), _parse_icepahc_key)
+    return _parse_icepahc(tag, vector)
+
+
+def _parse_icepahc_key(key):
+    return _parse_icepahc(*key)
+
+
+def _parse_icepahc(tag: str, vector=False):
     if vector:
-        return POSFeatures()
+        return PackedPOSFeatures(parse_icepahc_bits(tag))
     if len(tag) > 0:
-        value = POSIcePaHC.parse(tag.lower(), vector)
-    else:
-        if vector:
-            value = POSFeatures()
-        else:
-            value = ""
-    return value
+        return POSIcePaHC.parse(tag.lower(), vector)
+    return ""
+
+
+def parse_icepahc_bits(tag: str) -> int:
+    """
+    Fast path of parse_icepahc(tag, True): the precomputed bitmask of the tag is returned, nothing is allocated for
+    valid tags.
+
+    >>> parse_icepahc_bits("NKEE") == POSIcePaHC.parse("nkee", True).pack().bits
+    True
+    >>> all(parse_icepahc_bits(tag) == POSIcePaHC.parse(tag, True).pack().bits for tag in get_inventory())
+    True
+
+    :param tag: IcePaHC tag, in any case
+    :return: bitmask whose bit i is FEATURE_NAMES[i], 0 for an empty tag
+    """
+    if not tag:
+        return 0
+    return get_decoder().decode_bits(tag.lower())
+
+
+def parse_icepahc_into(tag: str, out: np.ndarray, row=None) -> np.ndarray:
+    """
+    Fast path of parse_icepahc(tag, True) which writes the features in a buffer of the caller.
+
+    >>> buffer = np.zeros((len(get_inventory()), len(FEATURE_NAMES)), dtype=bool)
+    >>> for i, tag in enumerate(get_inventory()):
+    ...     _ = parse_icepahc_into(tag, buffer, i)
+    >>> all(buffer[i].tolist() == POSIcePaHC.parse(tag, True).vectorize() for i, tag in enumerate(get_inventory()))
+    True
+
+    :param tag: IcePaHC tag, in any case
+    :param out: boolean array, either a vector of length len(FEATURE_NAMES) or a matrix with such rows
+    :param row: index of the row of out to fill, if out is a matrix
+    :return: the filled vector
+    """
+    if row is not None:
+        out = out[row]
+    if not tag:
+        out[:] = False
+        return out
+    return get_decoder().decode_into(tag.lower(), out)
+
+
+def parse_many_icepahc(tags, sparse=False):
+    """
+    >>> matrix = parse_many_icepahc(["nkee", "P", "nkee", ""])
+    >>> matrix.shape
+    (4, 48)
+    >>> matrix[:, FEATURE_INDICES["noun"]].tolist()
+    [True, False, True, False]
+    >>> parse_many_icepahc(["cc", "nkee"])[:, FEATURE_INDICES["conjunction"]].tolist()
+    [True, False]
+
+    :param tags: IcePaHC tags
+    :param sparse: if True, a scipy.sparse CSR matrix is returned
+    :return: boolean feature matrix with one row per tag
+    """
+    decoder = get_decoder()
+    return features_matrix(tags, lambda tag: decoder.decode(tag.lower()).features if tag else [], sparse)
 
 
 if __name__ == "__main__":
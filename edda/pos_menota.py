@@ -3,7 +3,7 @@
 """
 
 
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from pos_utils import *
 
 
@@ -97,7 +97,7 @@ class Number(POSElement):
     def binarize(tag, value):
         value.singular = tag == Number.singular
         value.plural = tag == Number.plural
-        value.plural = tag == Number.dual
+        value.dual = tag == Number.dual
         return value
 
 
@@ -112,7 +112,7 @@ class Case(POSElement):
 
     verbose = defaultdict(str)
     verbose[nominative] = "nominative"
-    verbose[accusative] = "feminine"
+    verbose[accusative] = "accusative"
     verbose[genitive] = "genitive"
     verbose[dative] = "dative"
     verbose[oblique] = "oblique"
@@ -323,8 +323,7 @@ class Finitness(POSElement):
 
     @staticmethod
     def binarize(tag, value):
-        value.finite = tag == Finitness.finite
-        value.infinite = tag == Finitness.infinite
+        value.infinitive = tag == Finitness.infinite
         value.participle = tag == Finitness.participle
         return value
 
@@ -378,8 +377,8 @@ class Enclitic(POSElement):
 
     @staticmethod
     def binarize(tag, value):
-        value.pronoun = tag == Enclitic.pronoun
-        value.negative_particle = tag == Enclitic.negative_particle
+        # enclitic pronouns are personal pronouns, the negative particle has no feature of FEATURE_NAMES
+        value.personal = tag == Enclitic.pronoun
         return value
 
 
@@ -445,6 +444,7 @@ class POSMenota(POSAbstract):
     verbose[WordClass.numeral_undetermined] = "numeral undetermined"
     verbose[WordClass.verb] = "verb"
     verbose[WordClass.adverb] = "adverb"
+    verbose[WordClass.adposition] = "preposition"
     verbose[WordClass.conjunction] = "conjunction"
     verbose[WordClass.subjunction] = "subjunction"
     verbose[WordClass.conjunction_subjunction] = "conjunction or subjunction"
@@ -471,6 +471,46 @@ class POSMenota(POSAbstract):
     universal[foreign] = "X"
     universal[punctuation] = "PUNC"
 
+    # IcePaHC word class of each Menota word class, the key of universal
+    icepahc = defaultdict(str)
+    for word_class in [WordClass.noun, WordClass.common_noun, WordClass.proper_noun]:
+        icepahc[word_class] = noun
+    icepahc[WordClass.adjective] = adjective
+    for word_class in [WordClass.personal_pronoun, WordClass.interrogative_pronoun, WordClass.indefinite_pronouns,
+                       WordClass.possessive, WordClass.demonstrative, WordClass.quantifier, WordClass.pronoun]:
+        icepahc[word_class] = pronoun
+    icepahc[WordClass.article] = article
+    for word_class in [WordClass.cardinal, WordClass.ordinal, WordClass.numeral_undetermined]:
+        icepahc[word_class] = numeral
+    icepahc[WordClass.verb] = verb
+    for word_class in [WordClass.adverb, WordClass.preposition, WordClass.adposition, WordClass.interjection]:
+        icepahc[word_class] = adverb
+    for word_class in [WordClass.conjunction, WordClass.subjunction, WordClass.conjunction_subjunction,
+                       WordClass.infinitive_marker, WordClass.relative_particle]:
+        icepahc[word_class] = conjunction
+    icepahc[WordClass.unassigned] = unanalysed
+    del word_class
+
+    @staticmethod
+    def parse_universal(full_tag):
+        """
+        >>> POSMenota.parse_universal('xNC gN nS cG sI')
+        'NOUN'
+        >>> POSMenota.parse_universal('xVB fF tPS mIN p1 nS vA iST')
+        'VERB'
+        >>> POSMenota.parse_universal('xAP')
+        'ADP'
+        >>> POSMenota.parse_universal('xCU')
+        'CONJ'
+
+        :param full_tag: me:msa value
+        :return: tag of the universal tagset, an empty string if the word class is unknown
+        """
+        word_class = full_tag.split(DELIMITER)[0].split(" ")[0][1:]
+        if word_class in [WordClass.preposition, WordClass.adposition]:
+            return "ADP"
+        return POSMenota.universal.get(POSMenota.icepahc.get(word_class), "")
+
     @staticmethod
     def apply(tag: list, l_pos: list, value: str):
         #         print(tag)
@@ -514,195 +554,181 @@ class POSMenota(POSAbstract):
     @staticmethod
     def parse(full_tag, vector=False):
         """
-        >>> POSMenota.parse('xPE p1 nD cN')
+        >>> POSMenota.parse('xNC gN nS cG sI')
+        'common noun neuter singular genitive indefinite'
+        >>> POSMenota.parse('xVB fF tPS mIN p1 nS vA iST')
+        'verb finite present indicative first singular active strong'
+        >>> POSMenota.parse('xCU')
+        'conjunction or subjunction'
+        >>> POSMenota.parse('xPD cD')
+        'pronoun dative'
+        >>> POSMenota.parse('xNC gN nP cN sI|xNC gM nS cA sI')
+        'common noun neuter plural nominative indefinite'
+        >>> POSMenota.parse('xNC gN nS cG sI', True).neuter
+        True
+        >>> [name for name, value in zip(FEATURE_NAMES, POSMenota.parse('xNC gN nP cA sI', True).vectorize()) if value]
+        ['neuter', 'plural', 'accusative', 'indefinite', 'noun']
+        >>> [name for name, value in zip(FEATURE_NAMES, POSMenota.parse('xNP gM nD cN', True).vectorize()) if value]
+        ['masculine', 'dual', 'nominative', 'noun', 'proper_noun']
+        >>> POSMenota.parse('xNC gM nP cA sD')
+        'common noun masculine plural accusative definite'
+        >>> POSMenota.parse('xAP yD')
+        'preposition dative'
+        >>> [name for name, value in zip(FEATURE_NAMES, POSMenota.parse('xAP yD', True).vectorize()) if value]
+        ['dative', 'adverb']
 
         :param full_tag:
         :param vector:
         :return:
         """
+        # only the first of alternative analyses is decoded
+        tags = full_tag.split(DELIMITER)[0].split(" ")
+        if tags[0][0] != WordClass.identifier:
+            return None
+        word_class = tags[0][1:]
+        rule = GRAMMAR.get(word_class)
+        if word_class == WordClass.verb and len(tags) > 1 and tags[1][:1] == Finitness.identifier:
+            rule = VERB_GRAMMAR.get(tags[1][1:], rule)
+        if rule is None:
+            rule = GrammarRule((), {})
+
         features = POSFeatures()
-        tags = full_tag.split(" ")
+        for feature in rule.features:
+            setattr(features, feature, True)
+        values = [POSMenota.verbose.get(word_class, "")]
+        for tag in tags[1:]:
+            element = rule.slots.get(tag[:1])
+            if element is not None:
+                value = element.verbose.get(tag[1:], "")
+                if value:
+                    values.append(value)
+                element.binarize(tag[1:], features)
 
-        first_tag = tags[0][0]
-        if WordClass.identifier == first_tag:
-            word_class = tags[0][1:]
-            #             print(word_class)
-            value = ""
-            tag = tags[1:]
-            if word_class == WordClass.noun:
-                features.noun = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Gender, Number, Case, Species]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.proper_noun:
-                features.proper_noun = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Gender, Number, Case, Species]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.common_noun:
-                features.common_noun = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Gender, Number, Case, Species]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.adjective:
-                features.adjective = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Grade, Gender, Number, Case, Species, Grade]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.personal_pronoun:
-                features.personal_pronoun = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Person, Gender, Number, Case]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.interrogative_pronoun:
-                features.interrogative_pronoun = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Gender, Number, Case]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.indefinite_pronouns:
-                features.indefinite_pronouns = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Gender, Number, Case]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.possessive:
-                features.possessive = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Gender, Number, Case]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.demonstrative:
-                features.demonstrative = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Gender, Number, Case]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.quantifier:
-                features.quantifier = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Gender, Number, Case]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.article:
-                features.article = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Gender, Number, Case]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.pronoun:
-                features.pronoun = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Person, Gender, Number, Case]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.ordinal:
-                features.ordinal = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Gender, Number, Case, Species]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.cardinal:
-                features.cardinal = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Gender, Number, Case, Species]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.numeral_undetermined:
-                features.numeral = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Gender, Number, Case, Species]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.article:
-                features.article = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Gender, Number, Case, Species]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.verb:
-                features.verb = True
-                value = POSMenota.verbose[word_class]
-                verb_class = tags[1][1]
-                if verb_class == "F":
-                    parsers = [Finitness, Tense, Mood, Person, Number, Voice, InflectionalClass]
-                    value = POSMenota.apply(tag, parsers, value)
-                    features = POSMenota.binarize(tag, parsers, features)
-                elif verb_class == "P":
-                    parsers = [Finitness, Tense, Voice, Gender, Number, Case, Species, InflectionalClass]
-                    value = POSMenota.apply(tag, parsers, value)
-                    features = POSMenota.binarize(tag, parsers, features)
-                elif verb_class == "I":
-                    parsers = [Finitness, Tense, Voice, InflectionalClass]
-                    value = POSMenota.apply(tag, parsers, value)
-                    features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.adverb:
-                features.adverb = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Grade]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.preposition:
-                features.preposition = True
-                value = POSMenota.verbose[word_class]
-                parsers = [Government]
-                value = POSMenota.apply(tag, parsers, value)
-                features = POSMenota.binarize(tag, parsers, features)
-
-            elif word_class == WordClass.adposition:
-                value = POSMenota.verbose[word_class]
-                features.preposition = True
-
-            elif word_class == WordClass.conjunction:
-                value = POSMenota.verbose[word_class]
-                features.conjunction = True
-
-            elif word_class == WordClass.conjunction_subjunction:
-                value = POSMenota.verbose[word_class]
-                features.conjunction = True
-
-            elif word_class == WordClass.subjunction:
-                value = POSMenota.verbose[word_class]
-                features.conjunction = True
-
-            if vector:
-                return features
-            else:
-                return value
+        if vector:
+            return features
+        else:
+            return " ".join(values)
+
+
+# Attributes of POSFeatures set to True for a word class, and the elements which may follow the word class,
+# indexed by their identifier
+GrammarRule = namedtuple("GrammarRule", ["features", "slots"])
+
+
+def compile_rule(features, elements) -> GrammarRule:
+    return GrammarRule(tuple(features), {element.identifier: element for element in elements})
+
+
+GRAMMAR = {
+    WordClass.noun: compile_rule(["noun"], [Gender, Number, Case, Species]),
+    WordClass.proper_noun: compile_rule(["noun", "proper_noun"], [Gender, Number, Case, Species]),
+    WordClass.common_noun: compile_rule(["noun"], [Gender, Number, Case, Species]),
+    WordClass.adjective: compile_rule(["adjective"], [Grade, Gender, Number, Case, Species]),
+    WordClass.personal_pronoun: compile_rule(["personal"], [Person, Gender, Number, Case]),
+    WordClass.interrogative_pronoun: compile_rule(["interrogative"], [Gender, Number, Case]),
+    WordClass.indefinite_pronouns: compile_rule(["indefinite"], [Gender, Number, Case]),
+    WordClass.possessive: compile_rule(["possessive"], [Gender, Number, Case]),
+    WordClass.demonstrative: compile_rule(["demonstrative"], [Gender, Number, Case]),
+    WordClass.quantifier: compile_rule(["indefinite_demonstrative"], [Gender, Number, Case]),
+    WordClass.article: compile_rule(["article"], [Gender, Number, Case]),
+    WordClass.pronoun: compile_rule(["demonstrative"], [Person, Gender, Number, Case]),
+    WordClass.ordinal: compile_rule(["numeral"], [Gender, Number, Case, Species]),
+    WordClass.cardinal: compile_rule(["numeral"], [Gender, Number, Case, Species]),
+    WordClass.numeral_undetermined: compile_rule(["numeral"], [Gender, Number, Case, Species]),
+    WordClass.verb: compile_rule(["verb"], [Finitness, Tense, Mood, Person, Number, Voice, Gender, Case, Species,
+                                            InflectionalClass]),
+    WordClass.adverb: compile_rule(["adverb"], [Grade]),
+    # prepositions are adverbs with a case in IcePaHC
+    WordClass.preposition: compile_rule(["adverb"], [Government]),
+    WordClass.adposition: compile_rule(["adverb"], [Government]),
+    WordClass.conjunction: compile_rule(["conjunction"], []),
+    WordClass.conjunction_subjunction: compile_rule(["conjunction"], []),
+    WordClass.subjunction: compile_rule(["conjunction"], []),
+}
+
+# Verbs are finite (F), participles (P) or infinitives (I). The rule of GRAMMAR is used when finiteness is missing.
+VERB_GRAMMAR = {
+    Finitness.finite: compile_rule(["verb"], [Finitness, Tense, Mood, Person, Number, Voice, InflectionalClass]),
+    Finitness.participle: compile_rule(["verb"], [Finitness, Tense, Voice, Gender, Number, Case, Species,
+                                                  InflectionalClass]),
+    Finitness.infinite: compile_rule(["verb"], [Finitness, Tense, Voice, InflectionalClass]),
+}
+
+
+_cache = None
+
+
+def enable_cache(maxsize=4096) -> TagCache:
+    """
+    Memoizes parse. Cached feature vectors are returned as immutable PackedPOSFeatures.
+
+    >>> cache = enable_cache(maxsize=16)
+    >>> parse("xCU"), parse("xCU"), parse("xCU", True).noun
+    ('conjunction or subjunction', 'conjunction or subjunction', False)
+    >>> cache.hits, cache.misses
+    (1, 2)
+    >>> parse("xCC", True).conjunction, parse("xCC", True).conjunction
+    (True, True)
+    >>> disable_cache()
+
+    :param maxsize: maximum number of cached (tag, vector) pairs
+    :return: the cache, whose counters can be read with TagCache.stats
+    """
+    global _cache
+    _cache = TagCache(maxsize)
+    return _cache
+
+
+def disable_cache():
+    global _cache
+    _cache = None
+
+
+def cache_stats() -> dict:
+    """
+    :return: counters of the enabled cache, an empty dict if caching is disabled
+    """
+    return _cache.stats() if _cache is not None else {}
 
 
 def parse(tag, vector=False):
-    #     print(tag)
-    if tag is None:
-        return POSFeatures
-    if len(tag) > 0:
-        value = POSMenota.parse(tag.lower(), vector)
+    if _cache is not None:
+        return _cache.get_or_parse((tag, vector), _parse_key)
+    return _parse(tag, vector)
+
+
+def _parse_key(key):
+    return _parse(*key)
+
+
+def _parse(tag, vector=False):
+    if tag is not None and len(tag) > 0:
+        value = POSMenota.parse(tag, vector)
     else:
         if vector:
             value = POSFeatures()
         else:
             value = ""
     return value
+
+
+def parse_many(tags, sparse=False):
+    """
+    >>> matrix = parse_many(["xNC gN nS cG sI", "xCU", "xNC gN nS cG sI"])
+    >>> matrix.shape
+    (3, 48)
+    >>> bool((matrix[0] == matrix[2]).all()), bool(matrix[0, FEATURE_INDICES["neuter"]])
+    (True, True)
+
+    :param tags: me:msa values, None for missing annotations
+    :param sparse: if True, a scipy.sparse CSR matrix is returned
+    :return: boolean feature matrix with one row per tag
+    """
+    return features_matrix([tag or "" for tag in tags], _vectorize, sparse)
+
+
+def _vectorize(tag):
+    features = parse(tag, True)
+    if features is None:
+        return []
+    return features.vectorize()
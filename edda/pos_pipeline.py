@@ -0,0 +1,103 @@
+"""
+Streaming decoding of the POS tagged poems of eddas.reader.
+
+Each stage is a generator which takes the tokens of the previous stage, so that tokens go one by one from the corpus
+reader to the output file and the memory used does not depend on the size of the text:
+
+>>> tokens = [TaggedToken("Völuspá", 0, 0, "Hljóðs", "NHEE"), TaggedToken("Völuspá", 0, 0, ".", ".")]
+>>> [token.analysis for token in decode_tags(filter_punctuation(tokens))]
+['noun neuter singular genitive']
+
+$ python pos_pipeline.py --output poetic_edda_pos.tsv
+"""
+import argparse
+import codecs
+import csv
+from collections import namedtuple
+
+from pos_icepahc import parse_icepahc
+
+__author__ = ["Clément Besnier <clemsciences@aol.com>", ]
+
+
+TaggedToken = namedtuple("TaggedToken", ["title", "stanza", "line", "word", "tag"])
+DecodedToken = namedtuple("DecodedToken", ["title", "stanza", "line", "word", "tag", "analysis"])
+
+PUNCTUATION_TAGS = frozenset(["ta", "p", "", "-", "?", ";", ".", ":", "!"])
+
+
+def read_tagged_tokens(titles=None):
+    """
+    :param titles: titles of eddas.reader.poetic_edda_titles, all of them by default
+    :return: generator of TaggedToken, read lazily from the corpus views
+    """
+    from eddas import reader
+
+    if titles is None:
+        titles = reader.poetic_edda_titles
+    for title in titles:
+        for i, para in enumerate(reader.PoeticEddaPOSTaggedReader(title).tagged_paras()):
+            for j, sent in enumerate(para):
+                for word, tag in sent:
+                    yield TaggedToken(title, i, j, word, tag)
+
+
+def filter_punctuation(tokens):
+    """
+    :param tokens: TaggedToken iterable
+    :return: generator of the tokens whose tag is not a punctuation tag
+    """
+    for token in tokens:
+        if token.tag.lower() not in PUNCTUATION_TAGS:
+            yield token
+
+
+def decode_tags(tokens, vector=False):
+    """
+    :param tokens: TaggedToken iterable
+    :param vector: if True, the analysis is the feature vector of the tag, its verbose form otherwise
+    :return: generator of DecodedToken
+    """
+    for token in tokens:
+        yield DecodedToken(*token, parse_icepahc(token.tag, vector))
+
+
+def write_tokens(tokens, f) -> int:
+    """
+    Writes one token by row, with tab-separated columns.
+
+    :param tokens: DecodedToken iterable
+    :param f: text file
+    :return: number of written tokens
+    """
+    writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+    writer.writerow(DecodedToken._fields)
+    n_tokens = 0
+    for token in tokens:
+        writer.writerow(token)
+        n_tokens += 1
+    return n_tokens
+
+
+def run_pipeline(filename: str, titles=None) -> int:
+    """
+    Reads, filters, decodes and writes all the tokens of the poems in one pass.
+
+    :param filename: path to the output file
+    :param titles: titles of eddas.reader.poetic_edda_titles, all of them by default
+    :return: number of written tokens
+    """
+    with codecs.open(filename, "w", encoding="utf-8") as f:
+        return write_tokens(decode_tags(filter_punctuation(read_tagged_tokens(titles))), f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decodes the POS tags of the Poetic Edda.")
+    parser.add_argument("titles", nargs="*", help="titles of the poems, all the poems by default")
+    parser.add_argument("--output", default="poetic_edda_pos.tsv", help="output file")
+    args = parser.parse_args(argv)
+    print(run_pipeline(args.output, args.titles or None))
+
+
+if __name__ == "__main__":
+    main()
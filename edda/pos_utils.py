@@ -2,10 +2,66 @@
 
 """
 import abc
+from collections import OrderedDict
+
+import numpy as np
 
 __author__ = ["Clément Besnier <clemsciences@aol.com>", ]
 
 
+FEATURE_NAMES = (
+    "masculine",
+    "feminine",
+    "neuter",
+    "singular",
+    "plural",
+    "dual",
+    "nominative",
+    "accusative",
+    "dative",
+    "genitive",
+    "definite",
+    "indefinite",
+    "positive",
+    "comparative",
+    "superlative",
+    "first",
+    "second",
+    "third",
+    "indicative",
+    "subjunctive",
+    "imperative",
+    "present",
+    "preterite",
+    "active",
+    "reflexive",
+    "infinitive",
+    "participle",
+    "strong",
+    "weak",
+    "reduplicating",
+    "preterito_present",
+    "noun",
+    "proper_noun",
+    "adjective",
+    "article",
+    "demonstrative",
+    "indefinite_demonstrative",
+    "possessive",
+    "personal",
+    "interrogative",
+    "relative",
+    "numeral",
+    "verb",
+    "adverb",
+    "foreign",
+    "punctuation",
+    "unanalysed",
+    "conjunction",
+)
+FEATURE_INDICES = {name: i for i, name in enumerate(FEATURE_NAMES)}
+
+
 class POSFeatures:
 
     def __init__(self):
@@ -53,67 +109,208 @@ class POSFeatures:
         self.numeral = False
         self.verb = False
         self.adverb = False
-        self.conjunction = False
         self.foreign = False
         self.punctuation = False
         self.unanalysed = False
+        self.conjunction = False
 
     def __eq__(self, other):
-        for i in range(len(self.vectorize())):
-            if self.vectorize()[i] != other.vectorize()[i]:
-                return False
-        return True
+        return self.vectorize() == other.vectorize()
+
+    def vectorize(self):
+        return [getattr(self, name) for name in FEATURE_NAMES]
+
+    def pack(self):
+        """
+        :return: immutable bit-packed copy of the features
+        """
+        return PackedPOSFeatures.from_vector(self.vectorize())
+
+
+class PackedPOSFeatures:
+    """
+    The features of POSFeatures packed into a single int: bit i is set iff FEATURE_NAMES[i] is True.
+
+    >>> features = POSFeatures()
+    >>> features.noun = True
+    >>> features.plural = True
+    >>> packed = features.pack()
+    >>> packed.noun, packed.verb
+    (True, False)
+    >>> packed.vectorize() == features.vectorize()
+    True
+    >>> packed == PackedPOSFeatures.from_vector(features.vectorize())
+    True
+    >>> packed.hamming(POSFeatures().pack())
+    2
+    >>> packed.unpack() == features
+    True
+    >>> tuple(vars(features)) == FEATURE_NAMES
+    True
+    >>> import copy, pickle
+    >>> pickle.loads(pickle.dumps(packed)) == packed, copy.deepcopy(packed) == packed
+    (True, True)
+
+    """
+    __slots__ = ("bits",)
+
+    def __init__(self, bits=0):
+        object.__setattr__(self, "bits", bits)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("PackedPOSFeatures is immutable")
+
+    def __getattr__(self, name):
+        # bits is missing only while the object is rebuilt, as by pickle or copy
+        if name == "bits" or name.startswith("__"):
+            raise AttributeError(name)
+        try:
+            return bool(self.bits >> FEATURE_INDICES[name] & 1)
+        except KeyError:
+            raise AttributeError(name)
+
+    def __eq__(self, other):
+        if isinstance(other, PackedPOSFeatures):
+            return self.bits == other.bits
+        if isinstance(other, POSFeatures):
+            return self.vectorize() == other.vectorize()
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __reduce__(self):
+        return PackedPOSFeatures, (self.bits,)
+
+    def __repr__(self):
+        return "PackedPOSFeatures({})".format(", ".join(name for name in FEATURE_NAMES if getattr(self, name)))
+
+    def hamming(self, other) -> int:
+        """
+        :param other: PackedPOSFeatures
+        :return: number of features which differ
+        """
+        return bin(self.bits ^ other.bits).count("1")
 
     def vectorize(self):
-        return [
-            self.masculine,
-            self.feminine,
-            self.neuter,
-            self.singular,
-            self.plural,
-            self.dual,
-            self.nominative,
-            self.accusative,
-            self.dative,
-            self.genitive,
-            self.definite,
-            self.indefinite,
-            self.positive,
-            self.comparative,
-            self.superlative,
-            self.first,
-            self.second,
-            self.third,
-            self.indicative,
-            self.subjunctive,
-            self.imperative,
-            self.present,
-            self.preterite,
-            self.active,
-            self.reflexive,
-            self.infinitive,
-            self.participle,
-            self.strong,
-            self.weak,
-            self.reduplicating,
-            self.preterito_present,
-            self.noun,
-            self.proper_noun,
-            self.adjective,
-            self.article,
-            self.demonstrative,
-            self.indefinite_demonstrative,
-            self.possessive,
-            self.personal,
-            self.interrogative,
-            self.relative,
-            self.numeral,
-            self.verb,
-            self.adverb,
-            self.foreign,
-            self.punctuation,
-            self.unanalysed
-        ]
+        return [bool(self.bits >> i & 1) for i in range(len(FEATURE_NAMES))]
+
+    def unpack(self) -> POSFeatures:
+        features = POSFeatures()
+        for name in FEATURE_NAMES:
+            setattr(features, name, getattr(self, name))
+        return features
+
+    @staticmethod
+    def from_vector(vector):
+        """
+        :param vector: booleans in the order of POSFeatures.vectorize
+        :return:
+        """
+        bits = 0
+        for i, value in enumerate(vector):
+            if value:
+                bits |= 1 << i
+        return PackedPOSFeatures(bits)
+
+
+def features_matrix(tags, vectorize, sparse=False):
+    """
+    Decodes each distinct tag once and scatters the rows back to the positions of the tags.
+
+    >>> features_matrix(["b", "a", "b"], lambda tag: [tag == "a", tag == "b"])[:, :2].astype(int).tolist()
+    [[0, 1], [1, 0], [0, 1]]
+
+    :param tags: sequence of tags
+    :param vectorize: function which maps a tag to its list of features in the order of FEATURE_NAMES
+    :param sparse: if True, a scipy.sparse CSR matrix is returned
+    :return: boolean matrix of shape (len(tags), number of features)
+    """
+    unique_tags, inverse = np.unique(np.asarray(tags, dtype=str), return_inverse=True)
+    unique_rows = np.zeros((len(unique_tags), len(FEATURE_NAMES)), dtype=bool)
+    for i, tag in enumerate(unique_tags):
+        row = vectorize(str(tag))
+        unique_rows[i, :len(row)] = row
+    inverse = inverse.reshape(-1)
+    if sparse:
+        from scipy import sparse as scipy_sparse
+        return scipy_sparse.csr_matrix(unique_rows)[inverse]
+    return unique_rows[inverse]
+
+
+class TagCache:
+    """
+    Bounded LRU cache for parsed tags. Feature vectors are stored as PackedPOSFeatures
+    so that cached values cannot be mutated by callers.
+
+    >>> cache = TagCache(maxsize=2)
+    >>> cache.get_or_parse("a", str.upper)
+    'A'
+    >>> cache.get_or_parse("a", str.upper)
+    'A'
+    >>> cache.get_or_parse("b", str.upper), cache.get_or_parse("c", str.upper)
+    ('B', 'C')
+    >>> cache.stats()
+    {'hits': 1, 'misses': 3, 'evictions': 1, 'size': 2, 'maxsize': 2}
+
+    Changing a returned value does not change the later hits:
+
+    >>> def parse_noun(key):
+    ...     features = POSFeatures()
+    ...     features.noun = True
+    ...     return features
+    >>> features = cache.get_or_parse("noun", parse_noun).unpack()
+    >>> features.noun = False
+    >>> cache.get_or_parse("noun", parse_noun).noun
+    True
+    >>> cache.get_or_parse("noun", parse_noun).noun = False
+    Traceback (most recent call last):
+    ...
+    AttributeError: PackedPOSFeatures is immutable
+
+    """
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_parse(self, key, parse):
+        """
+        :param key: hashable key, usually (tag, vector)
+        :param parse: function called with the key on a miss
+        :return: cached value
+        """
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            value = parse(key)
+            if isinstance(value, POSFeatures):
+                value = value.pack()
+            self.entries[key] = value
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            return value
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self.entries), "maxsize": self.maxsize}
 
 
 class POSElement:
@@ -0,0 +1,212 @@
+"""
+Conversion between the Menota msa values, the IcePaHC tags and the universal tagset of Petrov, Das and McDonald.
+
+Each distinct tag is converted once and the result is kept in a mapping table, so that whole token columns are
+converted with NumPy indexing.
+"""
+import numpy as np
+
+import pos_icepahc
+import pos_menota
+from pos_menota import WordClass
+
+__author__ = ["Clément Besnier <clemsciences@aol.com>", ]
+
+
+MENOTA = "menota"
+ICEPAHC = "icepahc"
+UNIVERSAL = "universal"
+
+# Values of the Menota elements and the IcePaHC characters at the same position
+GENDERS = {pos_menota.Gender.masculine: pos_icepahc.Gender.masculine,
+           pos_menota.Gender.feminine: pos_icepahc.Gender.feminine,
+           pos_menota.Gender.neuter: pos_icepahc.Gender.neuter}
+NUMBERS = {pos_menota.Number.singular: pos_icepahc.Number.singular,
+           pos_menota.Number.plural: pos_icepahc.Number.plural,
+           pos_menota.Number.dual: pos_icepahc.Number.plural}
+CASES = {pos_menota.Case.nominative: pos_icepahc.Case.nominative,
+         pos_menota.Case.accusative: pos_icepahc.Case.accusative,
+         pos_menota.Case.dative: pos_icepahc.Case.dative,
+         pos_menota.Case.genitive: pos_icepahc.Case.genitive}
+DECLENSIONS = {pos_menota.Species.indefinite: pos_icepahc.Declension.strong,
+               pos_menota.Species.definite: pos_icepahc.Declension.weak}
+DEGREES = {pos_menota.Grade.positive: pos_icepahc.Degree.positive,
+           pos_menota.Grade.comparative: pos_icepahc.Degree.comparative,
+           pos_menota.Grade.superlative: pos_icepahc.Degree.superlative}
+PERSONS = {pos_menota.Person.first: pos_icepahc.Person.first,
+           pos_menota.Person.second: pos_icepahc.Person.second,
+           pos_menota.Person.third: pos_icepahc.Person.third}
+MOODS = {pos_menota.Mood.indicative: pos_icepahc.Mood.indicative,
+         pos_menota.Mood.subjunctive: pos_icepahc.Mood.subjunctive,
+         pos_menota.Mood.imperative: pos_icepahc.Mood.imperative}
+VOICES = {pos_menota.Voice.active: pos_icepahc.Voice.active,
+          pos_menota.Voice.reflexive: pos_icepahc.Voice.middle}
+TENSES = {pos_menota.Tense.present: pos_icepahc.Tense.present,
+          pos_menota.Tense.preterite: pos_icepahc.Tense.past}
+GOVERNMENTS = {pos_menota.Government.accusative: "o",
+               pos_menota.Government.dative: "þ",
+               pos_menota.Government.genitive: "e"}
+
+PRONOUNS = {WordClass.personal_pronoun: pos_icepahc.Pronoun.personal,
+            WordClass.interrogative_pronoun: pos_icepahc.Pronoun.interrogative,
+            WordClass.indefinite_pronouns: pos_icepahc.Pronoun.indefinite,
+            WordClass.possessive: pos_icepahc.Pronoun.possessive,
+            WordClass.demonstrative: pos_icepahc.Pronoun.demonstrative,
+            WordClass.quantifier: pos_icepahc.Pronoun.indefinite,
+            WordClass.pronoun: pos_icepahc.Pronoun.demonstrative}
+NUMBER_CATEGORIES = {WordClass.cardinal: pos_icepahc.NumberCategory.cardinal,
+                     WordClass.ordinal: pos_icepahc.NumberCategory.ordinal,
+                     WordClass.numeral_undetermined: pos_icepahc.NumberCategory.cardinal}
+CONJUNCTIONS = {WordClass.conjunction: "cc",
+                WordClass.conjunction_subjunction: "cc",
+                WordClass.subjunction: "ct",
+                WordClass.relative_particle: "ct",
+                WordClass.infinitive_marker: "cn"}
+
+
+def menota_components(msa: str) -> dict:
+    """
+    >>> sorted(menota_components("xNC gN nS cG sI").items())
+    [('c', 'G'), ('g', 'N'), ('n', 'S'), ('s', 'I'), ('x', 'NC')]
+
+    :param msa: me:msa value
+    :return: value of each element, indexed by the identifier of the element
+    """
+    return {tag[:1]: tag[1:] for tag in msa.split(pos_menota.DELIMITER)[0].split(" ") if tag}
+
+
+def menota_to_icepahc(msa: str) -> str:
+    """
+    Builds the IcePaHC tag whose positions match the Menota elements. If an element required by the IcePaHC layout
+    is missing, only the word class is kept.
+
+    >>> menota_to_icepahc("xNC gN nS cG sI")
+    'nhee'
+    >>> menota_to_icepahc("xAJ rP gF nP cA sI")
+    'lvfosf'
+    >>> menota_to_icepahc("xVB fF tPT mIN p3 nS vA iST")
+    'sfg3eþ'
+    >>> menota_to_icepahc("xPE p1 nS cN")
+    'fp1en'
+    >>> menota_to_icepahc("xPD cN")
+    'f'
+
+    :param msa: me:msa value
+    :return: IcePaHC tag, an empty string if the word class is unknown
+    """
+    if not msa:
+        return ""
+    components = menota_components(msa)
+    word_class = components.get(WordClass.identifier, "")
+    letter = pos_menota.POSMenota.icepahc.get(word_class, "")
+    get = components.get
+
+    if letter == pos_icepahc.POSIcePaHC.noun:
+        positions = [GENDERS.get(get("g")), NUMBERS.get(get("n")), CASES.get(get("c"))]
+    elif letter == pos_icepahc.POSIcePaHC.adjective:
+        positions = [GENDERS.get(get("g")), NUMBERS.get(get("n")), CASES.get(get("c")),
+                     DECLENSIONS.get(get("s")), DEGREES.get(get("r"))]
+    elif letter == pos_icepahc.POSIcePaHC.pronoun:
+        positions = [PRONOUNS.get(word_class), PERSONS.get(get("p")) or GENDERS.get(get("g")),
+                     NUMBERS.get(get("n")), CASES.get(get("c"))]
+    elif letter == pos_icepahc.POSIcePaHC.article:
+        positions = [GENDERS.get(get("g")), NUMBERS.get(get("n")), CASES.get(get("c"))]
+    elif letter == pos_icepahc.POSIcePaHC.numeral:
+        positions = [NUMBER_CATEGORIES.get(word_class), GENDERS.get(get("g")), NUMBERS.get(get("n")),
+                     CASES.get(get("c"))]
+    elif letter == pos_icepahc.POSIcePaHC.verb:
+        finiteness = get("f")
+        if finiteness == pos_menota.Finitness.infinite:
+            positions = [pos_icepahc.Mood.infinitive, VOICES.get(get("v"), pos_icepahc.Voice.active)]
+        elif finiteness == pos_menota.Finitness.participle and get("t") == pos_menota.Tense.preterite:
+            positions = [pos_icepahc.Mood.past_participle, VOICES.get(get("v"), pos_icepahc.Voice.active),
+                         GENDERS.get(get("g")), NUMBERS.get(get("n")), CASES.get(get("c"))]
+        elif finiteness == pos_menota.Finitness.finite:
+            positions = [MOODS.get(get("m")), VOICES.get(get("v")), PERSONS.get(get("p")), NUMBERS.get(get("n")),
+                         TENSES.get(get("t"))]
+        else:
+            positions = [None]
+    elif letter == pos_icepahc.POSIcePaHC.adverb:
+        if word_class in [WordClass.preposition, WordClass.adposition]:
+            positions = [GOVERNMENTS.get(get("y"), "o")]
+        elif word_class == WordClass.interjection:
+            positions = ["u"]
+        else:
+            positions = ["a"]
+    elif letter == pos_icepahc.POSIcePaHC.conjunction:
+        return CONJUNCTIONS.get(word_class, letter)
+    else:
+        return letter
+
+    if None in positions:
+        return letter
+    return letter + "".join(positions)
+
+
+class TagsetConverter:
+    """
+    Converts tags between MENOTA, ICEPAHC and UNIVERSAL. Conversions of single tags are cached in mapping tables,
+    one by pair of tagsets.
+
+    >>> converter = TagsetConverter()
+    >>> converter.convert_column(["xNC gN nS cG sI", "xCU", "xNC gN nS cG sI"], MENOTA, UNIVERSAL).tolist()
+    ['NOUN', 'CONJ', 'NOUN']
+    >>> converter.convert_column(["NHEE", "P", "SFG1EÞ"], ICEPAHC, UNIVERSAL).tolist()
+    ['NOUN', 'PUNC', 'VERB']
+    >>> converter.convert("xNC gN nS cG sI", MENOTA, ICEPAHC)
+    'nhee'
+
+    """
+    def __init__(self):
+        self.tables = {}
+        self.converters = {
+            (MENOTA, ICEPAHC): menota_to_icepahc,
+            (MENOTA, UNIVERSAL): lambda tag: pos_menota.POSMenota.parse_universal(tag) if tag else "",
+            (ICEPAHC, UNIVERSAL): lambda tag: pos_icepahc.POSIcePaHC.parse_universal(tag.lower()) if tag else "",
+        }
+
+    def table(self, source: str, target: str) -> dict:
+        """
+        :return: the mapping table from source to target, IcePaHC tables start with all the valid tags
+        """
+        key = (source, target)
+        if key not in self.tables:
+            if key not in self.converters:
+                raise ValueError("no conversion from {} to {}".format(source, target))
+            self.tables[key] = {}
+            if source == ICEPAHC:
+                convert = self.converters[key]
+                self.tables[key].update((tag, convert(tag)) for tag in pos_icepahc.get_inventory())
+        return self.tables[key]
+
+    def convert(self, tag: str, source: str, target: str) -> str:
+        table = self.table(source, target)
+        try:
+            return table[tag]
+        except KeyError:
+            value = table[tag] = self.converters[(source, target)](tag)
+            return value
+
+    def convert_column(self, tags, source: str, target: str) -> np.ndarray:
+        """
+        :param tags: column of tags, None for missing tags
+        :param source: tagset of tags
+        :param target: wanted tagset
+        :return: array of converted tags
+        """
+        unique_tags, inverse = np.unique(np.asarray([tag or "" for tag in tags], dtype=str), return_inverse=True)
+        converted = np.asarray([self.convert(str(tag), source, target) for tag in unique_tags], dtype=str)
+        return converted[inverse.reshape(-1)]
+
+
+_converter = None
+
+
+def get_converter() -> TagsetConverter:
+    """
+    :return: the shared converter, whose mapping tables grow with the converted tags
+    """
+    global _converter
+    if _converter is None:
+        _converter = TagsetConverter()
+    return _converter
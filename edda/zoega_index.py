@@ -0,0 +1,441 @@
+"""
+Indices over the headwords of Zoëga's dictionary, read with the zoegas package.
+
+Headwords are indexed by a normalized key, so that the orthographic variants of the editions (ǫ and ø for ö,
+ǿ and œ for æ, i for j in the Menota lemmata) find the same entry.
+"""
+import bisect
+import hashlib
+import os
+import re
+import unicodedata
+from collections import namedtuple
+
+import numpy as np
+
+__author__ = ["Clément Besnier <clemsciences@aol.com>", ]
+
+
+LEXICON_NORMALIZATION = str.maketrans({"ǫ": "ö", "ø": "ö", "ǿ": "æ", "œ": "æ", "ę": "æ"})
+# Menota lemmata write i for the semivowel j, as in hlióð and biðia
+SEMIVOWEL_I = re.compile(r"(?<![aáeéiíoóuúyýæöj])i(?=[aáeéoóuúöæ])")
+
+CACHE_DIRECTORY = "zoega_cache"
+FUZZY_INDEX_FILENAME = os.path.join(CACHE_DIRECTORY, "fuzzy_index.npz")
+# Increment it when normalize_headword, variant_keys, deletions or deletion_hash change, so that the persisted fuzzy
+# index is rebuilt
+FUZZY_INDEX_VERSION = 1
+
+# Minimal entry, for headword lists which do not come from zoegas
+Headword = namedtuple("Headword", ["word"])
+
+
+def normalize_headword(word: str) -> str:
+    """
+    >>> normalize_headword("Vǫluspá")
+    'völuspá'
+    >>> normalize_headword("sœkja") == normalize_headword("sǿkja") == "sækja"
+    True
+
+    :param word: headword or lemma
+    :return: key of the word in the indices
+    """
+    return unicodedata.normalize("NFC", word or "").strip().lower().translate(LEXICON_NORMALIZATION)
+
+
+def load_entries() -> list:
+    """
+    :return: all the entries of Zoëga's dictionary which have a headword
+    """
+    from zoegas import reader
+
+    dictionary = reader.Dictionary(reader.dictionary_name)
+    dictionary.get_entries()
+    return [entry for entry in dictionary.entries if entry is not None and entry.word]
+
+
+def variant_keys(word: str) -> list:
+    """
+    >>> variant_keys("Hlióð")
+    ['hlióð', 'hljóð']
+    >>> variant_keys("heimr")
+    ['heimr']
+
+    :param word: headword or lemma
+    :return: keys under which the word may be indexed, the most likely first
+    """
+    key = normalize_headword(word)
+    semivowel_key = SEMIVOWEL_I.sub("j", key)
+    return [key] if semivowel_key == key else [key, semivowel_key]
+
+
+class PrefixIndex:
+    """
+    Sorted array of headwords, searched with bisect: the headwords which begin with a prefix are a contiguous range,
+    found in O(log n), and read lazily.
+
+    >>> index = PrefixIndex(["blár", "bláber", "blása", "blóð", "bláeygr", "vígband"])
+    >>> index.find_beginning_with("blá")
+    ['bláber', 'bláeygr', 'blár', 'blása']
+    >>> index.count_beginning_with("bl"), "blóð" in index, index.has_prefix("víg")
+    (5, True, True)
+    >>> index.prefixes_of("vígbandi")
+    ['vígband']
+
+    """
+    def __init__(self, words):
+        """
+        :param words: headwords, normalized with normalize_headword
+        """
+        self.words = sorted(set(words))
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        i = bisect.bisect_left(self.words, word)
+        return i < len(self.words) and self.words[i] == word
+
+    def bounds(self, prefix: str):
+        """
+        :param prefix: normalized prefix
+        :return: range of the positions of the headwords which begin with prefix
+        """
+        return bisect.bisect_left(self.words, prefix), bisect.bisect_left(self.words, prefix + "\U0010ffff")
+
+    def has_prefix(self, prefix: str) -> bool:
+        start, stop = self.bounds(prefix)
+        return start < stop
+
+    def count_beginning_with(self, prefix: str) -> int:
+        start, stop = self.bounds(prefix)
+        return stop - start
+
+    def iter_beginning_with(self, prefix: str):
+        """
+        :param prefix: normalized prefix
+        :return: generator of the headwords which begin with prefix, in alphabetical order
+        """
+        start, stop = self.bounds(prefix)
+        for i in range(start, stop):
+            yield self.words[i]
+
+    def find_beginning_with(self, prefix: str) -> list:
+        start, stop = self.bounds(prefix)
+        return self.words[start:stop]
+
+    def prefixes_of(self, word: str, min_length=1) -> list:
+        """
+        :param word: normalized word
+        :param min_length: shortest prefix
+        :return: headwords which are prefixes of word, the shortest first
+        """
+        prefixes = []
+        for length in range(min_length, len(word) + 1):
+            prefix = word[:length]
+            start, stop = self.bounds(prefix)
+            if start == stop:
+                break
+            if self.words[start] == prefix:
+                prefixes.append(prefix)
+        return prefixes
+
+
+class HeadwordIndex:
+    """
+    Hash index from the normalized headwords to the entries. Homographs share the same key.
+
+    >>> index = HeadwordIndex([Headword("heimr"), Headword("sœkja"), Headword("spjall"), Headword("spjall")])
+    >>> [entry.word for entry in index.find("sökja")]
+    []
+    >>> [entry.word for entry in index.find("sǿkja")]
+    ['sœkja']
+    >>> len(index.find("Spjall")), "heimr" in index, len(index)
+    (2, True, 3)
+    >>> [entry.word for entry in HeadwordIndex([Headword("biðja")]).find("biðia")]
+    ['biðja']
+
+    """
+    def __init__(self, entries):
+        """
+        :param entries: objects with a word attribute, like zoegas entries
+        """
+        self.entries = list(entries)
+        self.positions = {}
+        for i, entry in enumerate(self.entries):
+            self.positions.setdefault(normalize_headword(entry.word), []).append(i)
+        self._prefix_index = None
+
+    @property
+    def prefix_index(self) -> PrefixIndex:
+        """
+        :return: prefix index over the normalized headwords, built on the first use
+        """
+        if self._prefix_index is None:
+            self._prefix_index = PrefixIndex(self.positions)
+        return self._prefix_index
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, word):
+        return len(self.find_positions(word)) > 0
+
+    def keys(self) -> list:
+        """
+        :return: the distinct normalized headwords
+        """
+        return list(self.positions)
+
+    def find_positions(self, word: str) -> list:
+        """
+        :param word: headword or lemma
+        :return: positions of its entries in self.entries
+        """
+        for key in variant_keys(word):
+            positions = self.positions.get(key)
+            if positions:
+                return positions
+        return []
+
+    def find(self, word: str) -> list:
+        """
+        :param word: headword or lemma
+        :return: entries of the word, an empty list if it is not in the dictionary
+        """
+        return [self.entries[i] for i in self.find_positions(word)]
+
+    def iter_beginning_with(self, prefix: str):
+        """
+        Same as zoegas Dictionary.find_beginning_with, without scanning the dictionary.
+
+        >>> index = HeadwordIndex([Headword("blár"), Headword("bláber"), Headword("heimr")])
+        >>> [entry.word for entry in index.iter_beginning_with("Blá")]
+        ['bláber', 'blár']
+
+        :param prefix: beginning of the headwords
+        :return: generator of the entries whose headword begins with prefix, in alphabetical order
+        """
+        for key in self.prefix_index.iter_beginning_with(normalize_headword(prefix)):
+            for i in self.positions[key]:
+                yield self.entries[i]
+
+
+_headword_index = None
+
+
+def get_headword_index() -> HeadwordIndex:
+    """
+    :return: the shared index over all the entries of Zoëga's dictionary, built on the first call
+    """
+    global _headword_index
+    if _headword_index is None:
+        _headword_index = HeadwordIndex(load_entries())
+    return _headword_index
+
+
+FuzzyMatch = namedtuple("FuzzyMatch", ["word", "distance"])
+
+
+def deletions(word: str, max_distance: int) -> set:
+    """
+    >>> sorted(deletions("ask", 1))
+    ['ak', 'as', 'ask', 'sk']
+
+    :param word: string
+    :param max_distance: maximum number of deleted characters
+    :return: the word and all the strings obtained by deleting up to max_distance characters
+    """
+    result = {word}
+    level = {word}
+    for _ in range(max_distance):
+        level = {string[:i] + string[i + 1:] for string in level for i in range(len(string))}
+        result.update(level)
+    return result
+
+
+def deletion_hash(string: str) -> int:
+    return int.from_bytes(hashlib.blake2b(string.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def edit_distance(first: str, second: str, max_distance: int) -> int:
+    """
+    Bounded Levenshtein distance. The common prefix and suffix are removed, then the three edits of the first
+    character are tried recursively with a smaller bound, which is fast for the small bounds of FuzzyIndex.
+
+    >>> edit_distance("agnar", "agnör", 2), edit_distance("agnar", "sagnar", 2), edit_distance("agnar", "heimr", 2)
+    (1, 1, 3)
+
+    :return: distance of the strings, max_distance + 1 if it is greater than max_distance
+    """
+    if abs(len(first) - len(second)) > max_distance:
+        return max_distance + 1
+    start = 0
+    shortest = min(len(first), len(second))
+    while start < shortest and first[start] == second[start]:
+        start += 1
+    end = 0
+    while end < shortest - start and first[-1 - end] == second[-1 - end]:
+        end += 1
+    first = first[start:len(first) - end]
+    second = second[start:len(second) - end]
+    if not first or not second:
+        return max(len(first), len(second))
+    best = max_distance + 1
+    for edited_first, edited_second in ((first[1:], second[1:]), (first[1:], second), (first, second[1:])):
+        bound = best - 2
+        if bound < 0:
+            break
+        distance = edit_distance(edited_first, edited_second, bound)
+        if distance <= bound:
+            best = distance + 1
+    return best
+
+
+def fuzzy_index_key(words, max_distance=2, prefix_length=10) -> str:
+    """
+    :param words: normalized headwords
+    :param max_distance: greatest edit distance of the queries
+    :param prefix_length: number of characters of the headwords whose deletions are indexed
+    :return: hash of the headwords, of the parameters and of FUZZY_INDEX_VERSION
+    """
+    digest = hashlib.sha256("{} {} {}".format(FUZZY_INDEX_VERSION, max_distance, prefix_length).encode("utf-8"))
+    for word in sorted(set(words)):
+        digest.update(word.encode("utf-8") + b"\n")
+    return digest.hexdigest()
+
+
+class FuzzyIndex:
+    """
+    Symmetric deletion index (SymSpell) for approximate search among headwords.
+    The deletions of the first prefix_length characters of each headword are hashed, the pairs (hash, headword) are
+    sorted so that the candidates of a query are found by a binary search on each of its own deletions.
+    Candidates are then checked with the Levenshtein distance.
+
+    >>> index = FuzzyIndex(["agnar", "agnör", "alnar", "annar", "arnar", "sagnar", "þagnar", "heimr"])
+    >>> index.query("agnar", k=3)
+    [FuzzyMatch(word='agnar', distance=0), FuzzyMatch(word='agnör', distance=1), FuzzyMatch(word='alnar', distance=1)]
+    >>> sorted(match.word for match in index.query("agnar"))
+    ['agnar', 'agnör', 'alnar', 'annar', 'arnar', 'sagnar', 'þagnar']
+    >>> index.query_many(["heimir"], k=1)
+    {'heimir': [FuzzyMatch(word='heimr', distance=1)]}
+    >>> index.key == fuzzy_index_key(["heimr", "agnar", "agnör", "alnar", "annar", "arnar", "sagnar", "þagnar"])
+    True
+
+    """
+    def __init__(self, words, max_distance=2, prefix_length=10, hashes=None, ids=None, key=None):
+        """
+        :param words: headwords, normalized with normalize_headword
+        :param max_distance: greatest edit distance of the queries
+        :param prefix_length: number of characters of the headwords whose deletions are indexed
+        :param hashes: sorted hashes of the deletions, computed when not given
+        :param ids: position in words of the headword of each hash
+        :param key: fuzzy_index_key of the index, computed when not given
+        """
+        self.words = sorted(set(words)) if hashes is None else list(words)
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        if key is None:
+            key = fuzzy_index_key(self.words, max_distance, prefix_length)
+        self.key = key
+        if hashes is None:
+            pairs = sorted({(deletion_hash(deletion), i) for i, word in enumerate(self.words)
+                            for deletion in deletions(word[:prefix_length], max_distance)})
+            hashes = np.fromiter((pair[0] for pair in pairs), dtype=np.uint64, count=len(pairs))
+            ids = np.fromiter((pair[1] for pair in pairs), dtype=np.int32, count=len(pairs))
+        self.hashes = hashes
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.words)
+
+    def save(self, filename: str):
+        np.savez(filename, words=np.asarray(self.words, dtype=str), hashes=self.hashes, ids=self.ids,
+                 parameters=np.asarray([self.max_distance, self.prefix_length], dtype=np.int32),
+                 key=np.asarray(self.key))
+
+    @staticmethod
+    def load(filename: str) -> "FuzzyIndex":
+        """
+        :param filename: .npz file written by FuzzyIndex.save
+        :return: the index, without recomputing any deletion, with an empty key if the file has none
+        """
+        with np.load(filename, allow_pickle=False) as arrays:
+            max_distance, prefix_length = arrays["parameters"].tolist()
+            key = str(arrays["key"]) if "key" in arrays.files else ""
+            return FuzzyIndex(arrays["words"].tolist(), max_distance, prefix_length, arrays["hashes"],
+                              arrays["ids"], key)
+
+    def candidates(self, word: str, max_distance: int) -> set:
+        """
+        :param word: normalized query
+        :param max_distance: greatest edit distance, at most self.max_distance
+        :return: positions of the headwords which share a deletion with the query
+        """
+        query_hashes = np.fromiter((deletion_hash(deletion)
+                                    for deletion in deletions(word[:self.prefix_length], max_distance)),
+                                   dtype=np.uint64)
+        starts = np.searchsorted(self.hashes, query_hashes, side="left")
+        stops = np.searchsorted(self.hashes, query_hashes, side="right")
+        candidates = set()
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            candidates.update(self.ids[start:stop].tolist())
+        return candidates
+
+    def query(self, word: str, k=None, max_distance=None) -> list:
+        """
+        :param word: headword or lemma
+        :param k: maximum number of results, all by default
+        :param max_distance: greatest edit distance, self.max_distance by default
+        :return: FuzzyMatch list, sorted by distance and then by headword
+        """
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        word = normalize_headword(word)
+        matches = []
+        for i in self.candidates(word, max_distance):
+            distance = edit_distance(word, self.words[i], max_distance)
+            if distance <= max_distance:
+                matches.append(FuzzyMatch(self.words[i], distance))
+        matches.sort(key=lambda match: (match.distance, match.word))
+        return matches if k is None else matches[:k]
+
+    def query_many(self, words, k=None, max_distance=None) -> dict:
+        """
+        :param words: headwords or lemmata, like the lemmata not found in the dictionary
+        :param k: maximum number of results by word, all by default
+        :param max_distance: greatest edit distance, self.max_distance by default
+        :return: FuzzyMatch list by distinct word
+        """
+        return {word: self.query(word, k, max_distance) for word in dict.fromkeys(words)}
+
+
+def get_prefix_index() -> PrefixIndex:
+    """
+    :return: the prefix index of the shared headword index
+    """
+    return get_headword_index().prefix_index
+
+
+_fuzzy_index = None
+
+
+def get_fuzzy_index(filename=FUZZY_INDEX_FILENAME) -> FuzzyIndex:
+    """
+    :param filename: where the index is persisted, it is built from get_headword_index and saved there if missing,
+    or if it was built from other headwords, parameters or FUZZY_INDEX_VERSION
+    :return: the shared approximate index over the headwords of Zoëga's dictionary
+    """
+    global _fuzzy_index
+    if _fuzzy_index is None:
+        words = get_headword_index().keys()
+        key = fuzzy_index_key(words)
+        if os.path.exists(filename):
+            index = FuzzyIndex.load(filename)
+            if index.key == key:
+                _fuzzy_index = index
+        if _fuzzy_index is None:
+            _fuzzy_index = FuzzyIndex(words, key=key)
+            os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+            _fuzzy_index.save(filename)
+    return _fuzzy_index
@@ -0,0 +1,223 @@
+"""
+Structured entries of Zoëga's dictionary, stored in SQLite.
+
+The descriptions of the zoegas entries are parsed once into headword, POS, gender, inflection, senses and
+cross-references, so that lexicon joins fetch the POS of thousands of lemmata with a single query.
+
+$ python zoega_store.py
+"""
+import os
+import re
+import sqlite3
+from collections import namedtuple
+
+from zoega_index import CACHE_DIRECTORY, load_entries, normalize_headword, variant_keys
+
+__author__ = ["Clément Besnier <clemsciences@aol.com>", ]
+
+
+STORE_FILENAME = os.path.join(CACHE_DIRECTORY, "zoega.sqlite")
+# Increment it when parse_description changes, so that the store is rebuilt
+STORE_VERSION = 1
+
+ParsedEntry = namedtuple("ParsedEntry", ["headword", "homograph", "pos", "gender", "inflection", "senses",
+                                         "cross_references"])
+
+# Abbreviations of the word classes in the descriptions, and the gender of the nouns
+ABBREVIATIONS = {"a": "adjective", "adv": "adverb", "art": "article", "conj": "conjunction", "f": "noun",
+                 "interj": "interjection", "m": "noun", "n": "noun", "num": "numeral", "prep": "preposition",
+                 "pron": "pronoun", "v": "verb"}
+GENDERS = {"m": "masculine", "f": "feminine", "n": "neuter"}
+
+HOMOGRAPH = re.compile(r"^([IVX]+)\)\s*(.*)$")
+SENSE = re.compile(r"^(\d+)\)\s*(.*)$")
+HEADER = re.compile(r"^(?:\((?P<inflection>[^)]*)\),?\s*)?"
+                    r"(?P<abbreviation>adv|prep|conj|pron|interj|num|art|a|v|m|f|n)\.(?:\s+|$)(?P<rest>.*)$")
+CROSS_REFERENCE = re.compile(r"(?:\bsee|=)\s+([^\W\d_][\w-]*)")
+
+
+def split_homographs(description: str) -> list:
+    """
+    :param description: description of a zoegas entry
+    :return: non-empty lines of each homograph, marked by I), II)...
+    """
+    sections = [[]]
+    for line in description.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        match = HOMOGRAPH.match(line)
+        if match:
+            if sections[-1]:
+                sections.append([])
+            if match.group(2):
+                sections[-1].append(match.group(2))
+        else:
+            sections[-1].append(line)
+    return [section for section in sections if section]
+
+
+def parse_section(headword: str, homograph: int, lines: list) -> ParsedEntry:
+    pos = gender = inflection = None
+    body = list(lines)
+    match = HEADER.match(body[0]) if body else None
+    if match:
+        abbreviation = match.group("abbreviation")
+        pos = ABBREVIATIONS[abbreviation]
+        gender = GENDERS.get(abbreviation)
+        inflection = match.group("inflection")
+        body = ([match.group("rest")] if match.group("rest") else []) + body[1:]
+
+    senses = []
+    for line in body:
+        match = SENSE.match(line)
+        if match:
+            senses.append(match.group(2))
+        elif senses:
+            senses[-1] += " " + line
+        else:
+            senses.append(line)
+    cross_references = [reference for line in lines for reference in CROSS_REFERENCE.findall(line)]
+    return ParsedEntry(headword, homograph, pos, gender, inflection, senses, cross_references)
+
+
+def parse_description(headword: str, description: str) -> list:
+    """
+    >>> entry, = parse_description("heimr", "\\n\\n(-s, -ar), m.\\n\\n1) a place of abode;\\n\\n2) this world.")
+    >>> entry.pos, entry.gender, entry.inflection, entry.senses
+    ('noun', 'masculine', '-s, -ar', ['a place of abode;', 'this world.'])
+    >>> [(entry.homograph, entry.pos, entry.senses) for entry in parse_description("spjall",
+    ...  "\\n\\nI)\\n\\nn. saying, tale.\\n\\nII)\\n\\nn.\\n\\n1) damage (taka s. af e-u);\\n\\n2) flaw.")]
+    [(1, 'noun', ['saying, tale.']), (2, 'noun', ['damage (taka s. af e-u);', 'flaw.'])]
+    >>> parse_description("at", "I) prep.\\n\\n4) along (= eptir);")[0][2:]
+    ('preposition', None, None, ['along (= eptir);'], ['eptir'])
+
+    :param headword: headword of the entry
+    :param description: description of the entry
+    :return: ParsedEntry list, one for each homograph
+    """
+    return [parse_section(headword, i, lines) for i, lines in enumerate(split_homographs(description or ""), 1)]
+
+
+class ZoegaStore:
+    """
+    SQLite store of the parsed entries.
+
+    >>> Entry = namedtuple("Entry", ["word", "description"])
+    >>> store = ZoegaStore(":memory:")
+    >>> store.build([Entry("heimr", "(-s, -ar), m. world."), Entry("vilja", "I) (vil, vilda, ~t), v. to will.")])
+    >>> store.pos_of(["Heimr", "vilja", "glýja"])
+    {'Heimr': ['noun'], 'vilja': ['verb'], 'glýja': []}
+    >>> store.find("heimr")[0].senses
+    ['world.']
+
+    """
+    def __init__(self, filename=STORE_FILENAME):
+        """
+        :param filename: path to the SQLite file, ":memory:" for a temporary store
+        """
+        if filename != ":memory:":
+            os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(filename)
+
+    def is_built(self) -> bool:
+        return self.connection.execute("PRAGMA user_version").fetchone()[0] == STORE_VERSION
+
+    def build(self, entries):
+        """
+        Parses all the entries and replaces the content of the store.
+
+        :param entries: objects with word and description attributes, like zoegas entries
+        """
+        with self.connection:
+            self.connection.executescript("""
+                DROP TABLE IF EXISTS entries;
+                DROP TABLE IF EXISTS senses;
+                DROP TABLE IF EXISTS cross_references;
+                CREATE TABLE entries (id INTEGER PRIMARY KEY, headword TEXT, key TEXT, homograph INTEGER, pos TEXT,
+                                      gender TEXT, inflection TEXT);
+                CREATE TABLE senses (entry_id INTEGER, number INTEGER, text TEXT);
+                CREATE TABLE cross_references (entry_id INTEGER, target TEXT);
+            """)
+            entry_id = 0
+            for entry in entries:
+                for parsed in parse_description(entry.word, entry.description):
+                    entry_id += 1
+                    self.connection.execute("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                            (entry_id, parsed.headword, normalize_headword(parsed.headword),
+                                             parsed.homograph, parsed.pos, parsed.gender, parsed.inflection))
+                    self.connection.executemany("INSERT INTO senses VALUES (?, ?, ?)",
+                                                [(entry_id, i, sense) for i, sense in enumerate(parsed.senses, 1)])
+                    self.connection.executemany("INSERT INTO cross_references VALUES (?, ?)",
+                                                [(entry_id, target) for target in parsed.cross_references])
+            self.connection.executescript("""
+                CREATE INDEX entries_key ON entries (key);
+                CREATE INDEX senses_entry ON senses (entry_id);
+                CREATE INDEX cross_references_entry ON cross_references (entry_id);
+            """)
+            self.connection.execute("PRAGMA user_version = {}".format(STORE_VERSION))
+
+    def pos_of(self, lemmata) -> dict:
+        """
+        :param lemmata: lemmata, in any case and spelling handled by zoega_index.variant_keys
+        :return: distinct POS of the entries of each lemma, in the order of the homographs
+        """
+        lemmata = list(dict.fromkeys(lemmata))
+        keys = {lemma: variant_keys(lemma) for lemma in lemmata}
+        with self.connection:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS lemma_keys (key TEXT)")
+            self.connection.execute("DELETE FROM lemma_keys")
+            self.connection.executemany("INSERT INTO lemma_keys VALUES (?)",
+                                        [(key,) for lemma_keys in keys.values() for key in lemma_keys])
+            rows = self.connection.execute("""
+                SELECT entries.key, entries.pos FROM entries JOIN (SELECT DISTINCT key FROM lemma_keys) AS wanted
+                ON entries.key = wanted.key WHERE entries.pos IS NOT NULL ORDER BY entries.id
+            """).fetchall()
+        pos_by_key = {}
+        for key, pos in rows:
+            if pos not in pos_by_key.setdefault(key, []):
+                pos_by_key[key].append(pos)
+        result = {}
+        for lemma in lemmata:
+            result[lemma] = next((pos_by_key[key] for key in keys[lemma] if key in pos_by_key), [])
+        return result
+
+    def find(self, word: str) -> list:
+        """
+        :param word: headword or lemma
+        :return: ParsedEntry list of the word
+        """
+        for key in variant_keys(word):
+            rows = self.connection.execute("SELECT id, headword, homograph, pos, gender, inflection FROM entries "
+                                           "WHERE key = ? ORDER BY id", (key,)).fetchall()
+            if rows:
+                return [ParsedEntry(headword, homograph, pos, gender, inflection,
+                                    [text for text, in self.connection.execute(
+                                        "SELECT text FROM senses WHERE entry_id = ? ORDER BY number", (entry_id,))],
+                                    [target for target, in self.connection.execute(
+                                        "SELECT target FROM cross_references WHERE entry_id = ?", (entry_id,))])
+                        for entry_id, headword, homograph, pos, gender, inflection in rows]
+        return []
+
+    def close(self):
+        self.connection.close()
+
+
+_store = None
+
+
+def get_store(filename=STORE_FILENAME) -> ZoegaStore:
+    """
+    :param filename: path to the SQLite file, built from all the entries of Zoëga's dictionary if needed
+    :return: the shared store
+    """
+    global _store
+    if _store is None:
+        _store = ZoegaStore(filename)
+        if not _store.is_built():
+            _store.build(load_entries())
+    return _store
+
+
+if __name__ == "__main__":
+    print(get_store().connection.execute("SELECT pos, COUNT(*) FROM entries GROUP BY pos").fetchall())